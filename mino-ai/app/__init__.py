@@ -5,6 +5,8 @@ from .config import config_by_name
 from .api import register_routes
 from .services.chat_service import start_chat_service
 from .utils.env import load_env
+from .utils.query_stats import query_stats
+from .utils import request_queries, deadline
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,6 +44,9 @@ def create_app(config_name='dev'):
     app.config.from_object(config)
 
     config.init_app(app)
+    query_stats.init_app(app)
+    request_queries.init_app(app)
+    deadline.init_app(app)
 
     # Initialize CORS
     
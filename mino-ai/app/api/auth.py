@@ -1,14 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for
 
 from app.services.tenant_sync import sync_update_tenant
+from app.services import profile_image_service
 from ..models.user import User
+from ..models.user_image import UserImage
 from ..utils.auth import create_token, token_required
-from ..utils.file import get_base64_image
+from ..utils.file import get_image_format, load_image
+from ..utils.db import use_primary
+from ..utils import deadline, thumbnails
 import logging
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
 import base64
+import hmac
 import requests
 
 from app.models import user
@@ -18,18 +23,51 @@ logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
 
-def get_image_format(header):
-    """Detect image format from file header (magic bytes)"""
-    if header.startswith(b'\xff\xd8\xff'):
-        return 'jpg'
-    elif header.startswith(b'\x89PNG'):
-        return 'png'
-    elif header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):
-        return 'gif'
-    elif header.startswith(b'RIFF') and header[8:12] == b'WEBP':
-        return 'webp'
-    else:
+# Versioned image URLs never change content, so clients may keep them for a year
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+
+def image_fields(user_id, image_version):
+    """Profile image URL and version for auth responses (the bytes come from get_profile_image).
+
+    Append &size=<px> to image_url for a thumbnail; image_sizes lists the ones stored.
+    """
+    return {
+        'image_url': url_for('auth.get_profile_image', user_id=user_id, v=image_version) if image_version else None,
+        'image_version': image_version,
+        'image_sizes': list(thumbnails.thumbnail_sizes()) if image_version else []
+    }
+
+
+def store_thumbnails(user_id, image_data, image_version):
+    """Generate and store thumbnails for an image; returns {variant: (content_type, data)}"""
+    variants = thumbnails.make_thumbnails(image_data)
+    UserImage.replace(user_id, image_version, variants)
+    return variants
+
+
+def set_image_from_json(user, value):
+    """Apply the image field of a JSON profile update (a data: URL, or null to
+    remove the image). Saves the user; returns an error message or None."""
+    if not value:
+        profile_image_service.clear_profile_image(user)
         return None
+    # Only inline data: paths would let a client point at files or objects it doesn't own
+    if not isinstance(value, str) or not value.startswith('data:'):
+        return 'image must be a data: URL'
+    try:
+        image_data, _ = load_image(value)
+    except ValueError:
+        return 'Invalid image'
+    if not image_data:
+        return 'Invalid image'
+    if len(image_data) > 200 * 1024:
+        return 'File size exceeds 200KB limit'
+    try:
+        profile_image_service.save_profile_image(user, image_data)
+    except thumbnails.InvalidImage:
+        return 'Invalid image format'
+    return None
 
 
 def validate_image(stream):
@@ -64,7 +102,7 @@ def create_tenant_for_user(name, domain=None, plan=None):
         "plan": plan
     }
     try:
-        response = requests.post(AGENTIC_BASE_URL, json=payload)
+        response = requests.post(AGENTIC_BASE_URL, json=payload, timeout=deadline.timeout(10, 'tenant service'))
         if response.status_code == 201:
             tenant_data = response.json()
             # expected response must contain tenant_id
@@ -107,12 +145,12 @@ def signup():
             return jsonify({'error': 'Username, password and email are required'}), 400
 
         # Check if user already exists
-        if User.get_by_username(username):
+        if User.get_by_username(username, only=User.EXISTS_FIELDS):
             logger.warning(
                 f"Signup attempt with existing username: {username}")
             return jsonify({'error': 'Username already exists'}), 409
 
-        if User.get_by_email(email):
+        if User.get_by_email(email, only=User.EXISTS_FIELDS):
             logger.warning(f"Signup attempt with existing email: {email}")
             return jsonify({'error': 'Email already exists'}), 409
         # Create tenant for the new user
@@ -164,6 +202,7 @@ def login():
             logger.warning("Login attempt without username or email")
             return jsonify({'error': 'Username or email is required'}), 400
 
+        # The image stays deferred so failed logins never pull the BLOB
         user = User.get_by_username(username) if username else None
         if not user and email:
             user = User.get_by_email(email)
@@ -192,7 +231,7 @@ def login():
                 'firstname': user.firstname,
                 'lastname': user.lastname,
                 'credit_point': user.credit_point,
-                'image': get_base64_image(user.image),
+                **image_fields(user.id, user.current_image_version()),
                 'tenant_id': user.tenant_id,
                 'created_at': user.created_at.isoformat() if user.created_at else None,
                 'updated_at': user.updated_at.isoformat() if user.updated_at else None
@@ -245,25 +284,29 @@ def upload_profile_image(current_user_id):
             logger.error(f"User not found: {current_user_id}")
             return jsonify({'error': 'User not found'}), 404
 
-        # Save image to user profile
-        user.image = image_data
-        user.save()
+        # Store the original in object storage and its thumbnails; a file that only
+        # looks like an image by its header is rejected before anything is written
+        try:
+            image_version = profile_image_service.save_profile_image(user, image_data)
+        except thumbnails.InvalidImage as e:
+            logger.error(f"Invalid image for file {file.filename}: {str(e)}")
+            return jsonify({'error': 'Invalid image format'}), 400
 
-        # Verify the image was saved
-        updated_user = User.get_by_id(current_user_id)
-        if not updated_user.image:
+        # Verify the image was saved by comparing hashes, without reading the BLOB back;
+        # read from the primary so replica lag can't hide the write
+        with use_primary():
+            saved_version = User.get_image_version(current_user_id)
+        if saved_version != image_version:
             logger.error("Image not saved in database")
             return jsonify({'error': 'Failed to save image'}), 500
 
-        # Return the saved image in the response
         return jsonify({
             'message': 'Profile image updated successfully',
             'user': {
                 'id': user.id,
                 'username': user.username,
                 'email': user.email,
-                # Include the base64 image
-                'image': get_base64_image(user.image)
+                **image_fields(user.id, image_version)
             }
         }), 200
 
@@ -272,11 +315,74 @@ def upload_profile_image(current_user_id):
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
 
+@auth_bp.route('/profile/image/<int:user_id>', methods=['GET'])
+def get_profile_image(user_id):
+    """Serve a profile image as raw bytes with a strong ETag.
+
+    Public, like the image_url handed out in auth responses, since <img>
+    requests carry no Authorization header. ?v= must match the current
+    version, which only holders of an image_url know, so images can't be
+    enumerated by user id; such a URL may be cached for a year. With ?size=<px> the smallest stored thumbnail covering that size is
+    served instead, as WebP when the client accepts it and JPEG otherwise.
+    """
+    try:
+        size = request.args.get('size', type=int)
+        if size is not None and size <= 0:
+            return jsonify({'error': 'size must be a positive integer'}), 400
+
+        image_version = User.get_image_version(user_id)
+        # A wrong or missing version looks exactly like a missing image
+        if not image_version or not hmac.compare_digest(request.args.get('v', ''), image_version):
+            return jsonify({'error': 'Image not found'}), 404
+        cache_control = f"public, max-age={IMAGE_MAX_AGE}, immutable"
+
+        variant = None
+        etag = image_version
+        if size is not None:
+            variant = thumbnails.pick_variant(size, 'image/webp' in request.accept_mimetypes)
+            etag = f"{image_version}-{variant}"
+
+        # Revalidations are answered from the hash alone
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif variant is not None:
+            row = UserImage.get(user_id, variant)
+            if row and row['version'] == image_version:
+                image_data, mime_type = row['data'], row['content_type']
+            else:
+                # Uploaded before thumbnails existed (or a write raced): generate them now
+                original, original_mime = profile_image_service.load_original(user_id)
+                if original is None:
+                    return jsonify({'error': 'Image not found'}), 404
+                try:
+                    mime_type, image_data = store_thumbnails(user_id, original, image_version)[variant]
+                except thumbnails.InvalidImage as e:
+                    # Legacy uploads were only checked by their header; serve them as stored
+                    logger.warning(f"Cannot generate thumbnails for user {user_id}: {str(e)}")
+                    image_data, mime_type = original, original_mime
+            response = Response(image_data, mimetype=mime_type)
+        else:
+            image_data, mime_type = profile_image_service.load_original(user_id)
+            if image_data is None:
+                return jsonify({'error': 'Image not found'}), 404
+            response = Response(image_data, mimetype=mime_type)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if variant is not None:
+            response.vary.add('Accept')
+        return response
+
+    except Exception as e:
+        logger.error(f"Error serving profile image for user {user_id}: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
 @auth_bp.route('/profile', methods=['GET', 'PUT'])
 @token_required
 def user_profile(current_user_id):
     """Get or update user profile"""
     try:
+        # The image itself is served by get_profile_image; only its key and version are read here
         user = User.get_by_id(current_user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -290,7 +396,7 @@ def user_profile(current_user_id):
                 'firstname': user.firstname,
                 'lastname': user.lastname,
                 'credit_point': user.credit_point,
-                'image': get_base64_image(user.image),
+                **image_fields(user.id, user.current_image_version()),
                 'tenant_id': user.tenant_id,
                 'created_at': user.created_at.isoformat() if user.created_at else None,
                 'updated_at': user.updated_at.isoformat() if user.updated_at else None
@@ -308,11 +414,13 @@ def user_profile(current_user_id):
                 user.firstname = data['firstname']
             if 'lastname' in data:
                 user.lastname = data['lastname']
-            if 'image' in data:
-                user.image = data['image']
             if 'password' in data:
                 user.password = data['password']
 
+            if 'image' in data:
+                error = set_image_from_json(user, data['image'])
+                if error:
+                    return jsonify({'error': error}), 400
             user.save()
             # Sync tenant update - use getattr to safely access attributes that may not exist
             sync_update_tenant(
@@ -332,7 +440,7 @@ def user_profile(current_user_id):
                     'lastname': user.lastname,
                     'phone': user.phone,
                     'credit_point': user.credit_point,
-                    'image': get_base64_image(user.image),
+                    **image_fields(user.id, user.current_image_version()),
                     'tenant_id': user.tenant_id,
                     'created_at': user.created_at.isoformat() if user.created_at else None,
                     'updated_at': user.updated_at.isoformat() if user.updated_at else None
@@ -364,11 +472,13 @@ def update_user_profile(current_user_id):
             user.firstname = data['firstname']
         if 'lastname' in data:
             user.lastname = data['lastname']
-        if 'image' in data:
-            user.image = data['image']
         if 'password' in data:
             user.password = data['password']
 
+        if 'image' in data:
+            error = set_image_from_json(user, data['image'])
+            if error:
+                return jsonify({'error': error}), 400
         user.save()
         # Sync tenant update - use getattr to safely access attributes that may not exist
         sync_update_tenant(
@@ -402,23 +512,18 @@ def tenant_updated():
     data = request.get_json()
     tenant_id = data["tenant_id"]
     name = data.get("name")
-    domain = data.get("domain")
     plan = data.get("plan")
 
-    users = User.get_by_tenant_id(tenant_id)
-    if not users:
+    # users has no domain column, so a domain change has nothing to update here
+    result = User.update_tenant(tenant_id, name=name, plan=plan)
+    if not result['matched']:
         return jsonify({"error": "User not found"}), 404
 
-    for user in users:
-        if name:
-            user.username = name
-        if domain:
-            user.domain = domain
-        if plan:
-            user.subscription = plan  # map plan to subscription field
-        user.save()
-
-    return jsonify({"message": f"{len(users)} user(s) updated from tenant"}), 200
+    logger.info(f"Tenant {tenant_id} update applied to {result['updated']}/{result['matched']} user(s)")
+    return jsonify({
+        "message": f"{result['matched']} user(s) updated from tenant",
+        **result
+    }), 200
 
 
 @auth_bp.route('/sync/tenant', methods=['POST'])
@@ -429,16 +534,12 @@ def sync_tenant_to_users():
     if not tenant_id:
         return jsonify({"error": "tenant_id is required"}), 400
 
-    users = User.get_by_tenant_id(tenant_id)  # this returns a list
-    if not users:
+    result = User.update_tenant(tenant_id, name=data.get("name"), plan=data.get("plan"))
+    if not result['matched']:
         return jsonify({"error": "No users found for tenant"}), 404
 
-    for user in users:
-        if data.get("name"):
-            user.username = data["name"]
-        if data.get("plan"):
-            user.subscription = data["plan"]  # map plan to subscription field
-        user.save()
-        logger.info(f"User {user.id} synced from tenant {tenant_id}")
-
-    return jsonify({"message": f"{len(users)} user(s) synced"}), 200
+    logger.info(f"Tenant {tenant_id} synced to {result['updated']}/{result['matched']} user(s)")
+    return jsonify({
+        "message": f"{result['matched']} user(s) synced",
+        **result
+    }), 200
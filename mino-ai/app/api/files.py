@@ -1,16 +1,21 @@
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, send_file
-from ..services.file_service import process_file_upload, get_file_summary, delete_file_from_s3, get_transcript_pdf, save_edited_file
+from flask import Blueprint, Response, request, jsonify, current_app, send_from_directory, send_file
+from ..services.file_service import process_file_upload, get_file_summary, get_summary_html, summary_retry_after, delete_file_from_s3, get_transcript_pdf, save_edited_file
 from ..models.file import File
 from ..utils.auth import token_required
+from ..utils.request_queries import query_budget
+from ..utils import deadline
+from ..utils.deadline import request_deadline
+from ..utils.pagination import parse_limit, encode_cursor, decode_cursor, stream_json_page
+import os
+import math
 import logging
-import boto3
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 files_bp = Blueprint('files', __name__)
-s3_client = boto3.client('s3')
 
 @files_bp.route('/upload', methods=['POST'])
+@request_deadline(300)
 @token_required
 def upload_file(current_user_id):
     """Handle file upload"""
@@ -32,28 +37,41 @@ def upload_file(current_user_id):
         return jsonify({'error': 'File upload failed'}), 500
 
 @files_bp.route('/', methods=['GET'])
+@query_budget(1)
 @token_required
 def get_user_files(current_user_id):
-    """Get all files for a user"""
+    """Get a page of files for a user (?limit=, ?cursor= from the previous page's next_cursor)"""
     try:
-        files = File.get_user_files(current_user_id)
-        if not files:
-            return jsonify({'message': 'No files found for this user'}), 404
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        file_list = [{
-            'id': file.id,
-            'file_name': file.file_name,
-            'file_path': file.file_path,
-            'upload_time': file.upload_time.isoformat(),
-            'processed': file.processed
-        } for file in files]
+        files, next_key = File.get_user_files_page(current_user_id, limit, after)
+        if not files and not cursor:
+            return jsonify({'message': 'No files found for this user'}), 404
 
-        return jsonify({'files': file_list}), 200
+        next_cursor = encode_cursor(*next_key) if next_key else None
+        return Response(
+            stream_json_page('files', files, _serialize_file, next_cursor),
+            mimetype='application/json'
+        ), 200
 
     except Exception as e:
         logger.error(f"Error fetching user files: {str(e)}")
         return jsonify({'error': 'Failed to fetch files'}), 500
 
+def _serialize_file(file):
+    return {
+        'id': file.id,
+        'file_name': file.file_name,
+        'file_path': file.file_path,
+        'upload_time': file.upload_time.isoformat(),
+        'processed': file.processed
+    }
+
 @files_bp.route('/summary', methods=['GET', 'POST'])
 @token_required
 def get_file_summary_endpoint(current_user_id):
@@ -73,7 +91,8 @@ def get_file_summary_endpoint(current_user_id):
             # Get summary using file path from service
             summary = get_file_summary(file.file_path)
             if not summary:
-                return jsonify({'error': 'Failed to get file summary'}), 400
+                # Still being generated: tell pollers when to come back
+                return _summary_pending(file.file_path) or (jsonify({'error': 'Failed to get file summary'}), 400)
             
             return jsonify(summary), 200
 
@@ -109,6 +128,98 @@ def get_file_summary_endpoint(current_user_id):
             logger.error(f"Error saving edited summary: {str(e)}")
             return jsonify({'error': 'Failed to save edited summary'}), 500
 
+def _summary_pending(file_path):
+    """202 telling pollers when to come back, if the summary is still being generated"""
+    retry_after = summary_retry_after(file_path)
+    if not retry_after:
+        return None
+    response = jsonify({'status': 'processing', 'retry_after': math.ceil(retry_after)})
+    response.status_code = 202
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+# Most file ids one /summaries request may ask for; each uncached summary is an S3 GET
+SUMMARY_BATCH_MAX = 20
+# Seconds of budget below which /summaries starts no more fetches
+SUMMARY_BATCH_RESERVE = 2
+
+@files_bp.route('/summaries', methods=['GET'])
+@query_budget(1)
+@request_deadline(30)
+@token_required
+def get_file_summaries(current_user_id):
+    """Summaries for several files at once (?file_ids=1,2,3), for clients rendering a file list.
+
+    The files are loaded with one query for all ids; each entry is the summary,
+    {'status': 'processing', 'retry_after': seconds} while it is being generated,
+    or {'error': ...}. Summaries are fetched one after another, so when the
+    budget runs low the remaining files are answered as processing too and the
+    client asks again for those.
+    """
+    try:
+        try:
+            file_ids = list(dict.fromkeys(
+                int(file_id) for file_id in request.args.get('file_ids', '').split(',') if file_id.strip()))
+        except ValueError:
+            return jsonify({'error': 'file_ids must be a comma-separated list of ids'}), 400
+        if not file_ids:
+            return jsonify({'error': 'file_ids is required'}), 400
+        if len(file_ids) > SUMMARY_BATCH_MAX:
+            return jsonify({'error': f'At most {SUMMARY_BATCH_MAX} file ids per request'}), 400
+
+        summaries = {}
+        for file_id, file in zip(file_ids, File.loader().load_many(file_ids)):
+            if not file or file.user_id != current_user_id:
+                summaries[file_id] = {'error': 'File not found'}
+                continue
+            left = deadline.remaining()
+            if left is not None and left < SUMMARY_BATCH_RESERVE:
+                # Return what we have rather than lose the whole batch to a 504
+                summaries[file_id] = {'status': 'processing', 'retry_after': 1}
+                continue
+            summary = get_file_summary(file.file_path)
+            if summary:
+                summaries[file_id] = summary
+                continue
+            retry_after = summary_retry_after(file.file_path)
+            if retry_after:
+                summaries[file_id] = {'status': 'processing', 'retry_after': math.ceil(retry_after)}
+            else:
+                summaries[file_id] = {'error': 'Failed to get file summary'}
+        return jsonify({'summaries': summaries}), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching file summaries: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@files_bp.route('/summary/html', methods=['GET'])
+@token_required
+def get_file_summary_html(current_user_id):
+    """Get a file's summary rendered to sanitized HTML"""
+    try:
+        file_id = request.args.get('file_id')
+        if not file_id:
+            logger.warning("File ID is required for summary request")
+            return jsonify({'error': 'File ID is required'}), 400
+
+        # Verify file belongs to user
+        file = File.get_by_id(file_id)
+        if not file or file.user_id != current_user_id:
+            return jsonify({'error': 'File not found'}), 404
+
+        html, content_hash = get_summary_html(file.file_path)
+        if html is None:
+            return _summary_pending(file.file_path) or (jsonify({'error': 'Failed to get file summary'}), 400)
+
+        response = Response(html, mimetype='text/html')
+        response.set_etag(content_hash)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    except Exception as e:
+        logger.error(f"Error rendering summary HTML: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
 @files_bp.route('/download', methods=['GET'])
 @token_required
 def download_file(current_user_id):
@@ -119,38 +230,29 @@ def download_file(current_user_id):
             logger.warning("File ID is required for download")
             return jsonify({'error': 'File ID is required'}), 400
         
-        # Generate PDF
-        pdf_bytes, file_name = get_transcript_pdf(file_id, current_user_id)
+        # Generate PDF (served from the render cache when the summary is unchanged)
+        pdf_path, file_name = get_transcript_pdf(file_id, current_user_id)
         file_name = file_name.split('.')[0]
         # file_name = file_name + '.pdf'
         logger.info(f"File name: {file_name}")
         
-        if not pdf_bytes:
+        if not pdf_path:
             logger.error(f"Failed to generate PDF for file {file_id}: {file_name}")
             return jsonify({'error': file_name}), 400
             
-        # Log the size of the PDF for debugging
-        logger.info(f"Generated PDF size: {len(pdf_bytes)} bytes")
-        
         try:
-            # Save PDF temporarily for verification
-            temp_path = f"/tmp/transcript_{file_id}.pdf"
-            with open(temp_path, 'wb') as f:
-                f.write(pdf_bytes)
-            logger.info(f"PDF saved temporarily at {temp_path} for verification")
-            
-            # Send file from the temporary location
+            # The cache file is named by the content hash, which doubles as the ETag
             response = send_file(
-                temp_path,
+                pdf_path,
                 mimetype='application/pdf',
                 as_attachment=True,
-                download_name=f"{file_name}_transcript.pdf"
+                download_name=f"{file_name}_transcript.pdf",
+                etag=os.path.basename(pdf_path).rsplit('.', 1)[0],
+                conditional=True
             )
             
-            # Add headers to prevent caching
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
+            # Browsers must revalidate (cheap with the ETag) rather than reuse a stale copy
+            response.headers["Cache-Control"] = "private, no-cache"
             
             return response
             
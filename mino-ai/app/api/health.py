@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify
 from datetime import datetime
 import logging
+from ..utils.db import db_manager
+from ..utils.query_stats import query_stats
+from ..utils import model_cache, shared_cache
 
 logger = logging.getLogger(__name__)
 health_bp = Blueprint('health', __name__)
@@ -16,4 +19,15 @@ def health_check():
     }
 
     logger.debug("Health check completed")
-    return jsonify(health_status), 200 
\ No newline at end of file
+    return jsonify(health_status), 200 
+
+@health_bp.route('/health/db', methods=['GET'])
+def db_health_check():
+    """Connection pool and per-statement latency statistics"""
+    return jsonify({
+        "pool": db_manager.pool_stats(),
+        "queries": query_stats.snapshot(),
+        "model_cache": model_cache.stats(),
+        "shared_cache": shared_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }), 200
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 import os
 import uuid
 from app.services.speech_service import transcribe_audio
+from app.utils.deadline import request_deadline
 import tempfile
 
 UPLOAD_DIR = tempfile.gettempdir()
@@ -12,6 +13,7 @@ speech_api = Blueprint("speech_api", __name__)
 
 
 @speech_api.route("/transcribe", methods=["POST"])
+@request_deadline(300)
 def transcribe():
     if "audio" not in request.files:
         return jsonify({"error": "No audio file provided"}), 400
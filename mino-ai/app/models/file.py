@@ -1,6 +1,12 @@
 from datetime import datetime
 from ..utils.db import db_transaction, db_connection
+from ..utils.loader import get_loader, forget
+from ..utils import model_cache
+
 class File:
+    # Ids per WHERE id IN (...) so a huge batch never builds an unbounded statement
+    BATCH_SIZE = 500
+
     def __init__(self, id=None, user_id=None, file_name=None, file_path=None, 
                  job_id=None, upload_time=None, processed=False, file_size=None):
         self.id = id
@@ -14,6 +20,14 @@ class File:
 
     @classmethod
     def get_by_id(cls, file_id):
+        # Within a request, lookups go through the request's loader so repeated and
+        # announced (File.loader().want(...)) ids share one query
+        loader = cls.loader()
+        if loader is not None:
+            try:
+                return loader.load(int(file_id))
+            except (TypeError, ValueError):
+                return None
         with db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM user_files WHERE id = %s", (file_id,))
@@ -22,6 +36,34 @@ class File:
                     return cls(**file_data)
         return None
     
+    @classmethod
+    def get_many(cls, file_ids):
+        """Load files by id with one IN (...) query per BATCH_SIZE ids. Returns {id: File}"""
+        ids = list(dict.fromkeys(int(file_id) for file_id in file_ids))
+        files = {}
+        cache = model_cache.cache_for('File')
+        if cache is not None:
+            files = {file_id: cls(**row) for file_id, row in cache.get_many(ids).items()}
+            ids = [file_id for file_id in ids if file_id not in files]
+        if not ids:
+            return files
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(ids), cls.BATCH_SIZE):
+                    chunk = ids[start:start + cls.BATCH_SIZE]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f"SELECT * FROM user_files WHERE id IN ({placeholders})", chunk)
+                    for file_data in cursor.fetchall():
+                        files[file_data['id']] = cls(**file_data)
+                        if cache is not None:
+                            cache.set(file_data['id'], file_data)
+        return files
+
+    @classmethod
+    def loader(cls):
+        """Request-scoped DataLoader over get_many (None outside an app context)"""
+        return get_loader('File', cls.get_many)
+
     @classmethod
     def get_by_job_id(cls, job_id):
         with db_connection() as conn:
@@ -44,6 +86,36 @@ class File:
                 files = cursor.fetchall()
                 return [cls(**file_data) for file_data in files]
 
+    # Columns the listing endpoint needs
+    LIST_COLUMNS = ('id', 'file_name', 'file_path', 'upload_time', 'processed')
+
+    @classmethod
+    def get_user_files_page(cls, user_id, limit, after=None):
+        """One page of a user's files, newest first, using keyset pagination.
+
+        `after` is the (upload_time, id) of the last file on the previous page.
+        Returns (files, next_key); next_key is None on the last page. Served by
+        idx_user_upload_time so the cost doesn't grow with the page number.
+        """
+        query = f"SELECT {', '.join(cls.LIST_COLUMNS)} FROM user_files WHERE user_id = %s"
+        params = [user_id]
+        if after:
+            upload_time, file_id = after
+            query += " AND (upload_time < %s OR (upload_time = %s AND id < %s))"
+            params += [upload_time, upload_time, file_id]
+        query += " ORDER BY upload_time DESC, id DESC LIMIT %s"
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+
+        files = [cls(user_id=user_id, **row) for row in rows[:limit]]
+        next_key = (files[-1].upload_time, files[-1].id) if len(rows) > limit else None
+        return files, next_key
+
     def save(self):
         with db_transaction() as conn:
             with conn.cursor() as cursor:
@@ -76,6 +148,8 @@ class File:
                         self.file_size
                     ))
                     self.id = cursor.lastrowid
+        forget('File', self.id)
+        model_cache.invalidate('File', self.id)
         return self
 
     def delete(self):
@@ -86,6 +160,8 @@ class File:
         with db_transaction() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM user_files WHERE id = %s", (self.id,))
+        forget('File', self.id)
+        model_cache.invalidate('File', self.id)
         return True
 
     @staticmethod
@@ -107,5 +183,6 @@ class File:
                         FOREIGN KEY (user_id) REFERENCES users(id),
                         INDEX idx_user_id (user_id),
                         INDEX idx_job_id (job_id),
+                        INDEX idx_user_upload_time (user_id, upload_time, id)
                     )
                 """) 
\ No newline at end of file
@@ -1,10 +1,31 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from ..utils.db import db_transaction, db_connection
+from ..utils.loader import get_loader, forget
+from ..utils import model_cache
+from .base import BaseModel
 from datetime import datetime
 
-class User:
+class User(BaseModel):
+    TABLE = 'users'
+    COLUMNS = (
+        'id', 'username', 'email', 'password', 'phone', 'firstname', 'lastname', 'image',
+        'image_key', 'image_version', 'credit_point', 'created_at', 'updated_at', 'subscription', 'tenant_id'
+    )
+    # The legacy profile image BLOB only loads when something reads user.image; new
+    # images live in object storage (see profile_image_service) and only their key is here
+    DEFERRED_COLUMNS = ('image',)
+    COLUMN_ATTRIBUTES = {'password': '_password'}
+    UNCACHED_COLUMNS = ('password',)
+
+    # Ids per WHERE id IN (...) so a huge batch never builds an unbounded statement
+    BATCH_SIZE = 500
+
+    # Named projections for hot paths
+    EXISTS_FIELDS = ('id',)
+    CREDIT_FIELDS = ('id', 'credit_point')
+
     def __init__(self, id=None, username=None, email=None, password=None,
-                 phone=None, firstname=None, lastname=None, image=None,
+                 phone=None, firstname=None, lastname=None, image=None, image_key=None, image_version=None,
                  credit_point=0, created_at=None, updated_at=None, subscription='free', tenant_id=None):
         self.tenant_id = tenant_id
         self.id = id
@@ -15,6 +36,8 @@ class User:
         self.firstname = firstname
         self.lastname = lastname
         self.image = image
+        self.image_key = image_key
+        self.image_version = image_version
         self.credit_point = credit_point
         self.created_at = created_at or datetime.now()
         self.updated_at = updated_at or datetime.now()
@@ -46,18 +69,19 @@ class User:
             return False
 
     @classmethod
-    def get_by_username(cls, username):
+    def get_by_username(cls, username, only=None, defer=None):
         import logging
         logger = logging.getLogger(__name__)
         try:
+            columns = cls.column_sql(cls.select_columns(only, defer))
             with db_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(
-                        "SELECT * FROM users WHERE username = %s", (username,))
+                        f"SELECT {columns} FROM users WHERE username = %s", (username,))
                     user_data = cursor.fetchone()
                     if user_data:
                         logger.debug(f"Found user data for username: {username}")
-                        return cls(**user_data)
+                        return cls.from_row(user_data)
                     else:
                         logger.debug(f"No user found for username: {username}")
         except Exception as e:
@@ -65,18 +89,19 @@ class User:
         return None
 
     @classmethod
-    def get_by_email(cls, email):
+    def get_by_email(cls, email, only=None, defer=None):
         import logging
         logger = logging.getLogger(__name__)
         try:
+            columns = cls.column_sql(cls.select_columns(only, defer))
             with db_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(
-                        "SELECT * FROM users WHERE email = %s", (email,))
+                        f"SELECT {columns} FROM users WHERE email = %s", (email,))
                     user_data = cursor.fetchone()
                     if user_data:
                         logger.debug(f"Found user data for email: {email}")
-                        return cls(**user_data)
+                        return cls.from_row(user_data)
                     else:
                         logger.debug(f"No user found for email: {email}")
         except Exception as e:
@@ -84,73 +109,166 @@ class User:
         return None
 
     @classmethod
-    def get_by_id(cls, user_id):
+    def get_by_id(cls, user_id, only=None, defer=None):
+        """Get user by id. The image is deferred unless requested via only=/defer=()"""
+        if only is None and defer is None:
+            # Default projection goes through the request's loader, so repeated and
+            # announced (User.loader().want(...)) ids share one query
+            loader = cls.loader()
+            if loader is not None:
+                try:
+                    return loader.load(int(user_id))
+                except (TypeError, ValueError):
+                    return None
+        columns = cls.column_sql(cls.select_columns(only, defer))
         with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+                cursor.execute(f"SELECT {columns} FROM users WHERE id = %s", (user_id,))
                 user_data = cursor.fetchone()
                 if user_data:
-                    return cls(**user_data)
+                    return cls.from_row(user_data)
         return None
 
     @classmethod
-    def get_by_username_or_email(cls, identifier):
-        """Get user by either username or email"""
+    def get_image_version(cls, user_id):
+        """MD5 of the profile image, or None.
+
+        Rows not yet moved out of the image column are hashed by MySQL, so the
+        BLOB never leaves the server.
+        """
         with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COALESCE(image_version, MD5(image)) AS image_version FROM users WHERE id = %s",
+                    (user_id,))
+                row = cursor.fetchone()
+        return row['image_version'] if row else None
+
+    @classmethod
+    def get_legacy_image_batch(cls, after_id, limit):
+        """(id, image) rows whose image still sits in the image column, by id"""
+        with db_connection(primary=True) as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    SELECT * FROM users 
+                    SELECT id, image FROM users
+                    WHERE id > %s AND image IS NOT NULL AND image_key IS NULL
+                    ORDER BY id LIMIT %s
+                """, (after_id, limit))
+                return cursor.fetchall()
+
+    @classmethod
+    def move_legacy_image(cls, user_id, image_key, image_version, column_md5):
+        """Point a user at their moved image and clear the column, unless the column
+        changed since it was read. Returns whether the row was updated."""
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                # updated_at is left alone: the profile itself didn't change
+                updated = cursor.execute("""
+                    UPDATE users SET image_key = %s, image_version = %s, image = NULL
+                    WHERE id = %s AND image_key IS NULL AND MD5(image) = %s
+                """, (image_key, image_version, user_id, column_md5))
+        forget('User', int(user_id))
+        model_cache.invalidate('User', int(user_id))
+        return bool(updated)
+
+    def current_image_version(self):
+        """image_version, falling back to hashing a legacy image column"""
+        if self.image_version or self.image_key:
+            return self.image_version
+        return self.get_image_version(self.id)
+
+    @classmethod
+    def get_many(cls, user_ids, only=None, defer=None):
+        """Load users by id with one IN (...) query per BATCH_SIZE ids. Returns {id: User}"""
+        ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        users = {}
+        # Only the default projection is cached, so a hit always has the same columns
+        cache = model_cache.cache_for('User') if only is None and defer is None else None
+        if cache is not None:
+            users = {user_id: cls.from_row(row) for user_id, row in cache.get_many(ids).items()}
+            ids = [user_id for user_id in ids if user_id not in users]
+        if not ids:
+            return users
+        columns = cls.column_sql(cls.select_columns(only, defer))
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(ids), cls.BATCH_SIZE):
+                    chunk = ids[start:start + cls.BATCH_SIZE]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f"SELECT {columns} FROM users WHERE id IN ({placeholders})", chunk)
+                    for user_data in cursor.fetchall():
+                        users[user_data['id']] = cls.from_row(user_data)
+                        if cache is not None:
+                            cache.set(user_data['id'], cls.cache_row(user_data))
+        return users
+
+    @classmethod
+    def loader(cls):
+        """Request-scoped DataLoader over get_many (None outside an app context)"""
+        return get_loader('User', cls.get_many)
+
+    @classmethod
+    def get_by_username_or_email(cls, identifier, only=None, defer=None):
+        """Get user by either username or email"""
+        columns = cls.column_sql(cls.select_columns(only, defer))
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {columns} FROM users 
                     WHERE username = %s OR email = %s
                 """, (identifier, identifier))
                 user_data = cursor.fetchone()
                 if user_data:
-                    return cls(**user_data)
+                    return cls.from_row(user_data)
         return None
 
     @classmethod
-    def get_by_tenant_id(cls, tenant_id):
+    def get_by_tenant_id(cls, tenant_id, only=None, defer=None):
         """Get all users by tenant_id"""
+        columns = cls.column_sql(cls.select_columns(only, defer))
         with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users WHERE tenant_id = %s", (tenant_id,))
+                cursor.execute(f"SELECT {columns} FROM users WHERE tenant_id = %s", (tenant_id,))
                 users_data = cursor.fetchall()
                 if users_data:
-                    return [cls(**user_data) for user_data in users_data]
+                    return [cls.from_row(user_data) for user_data in users_data]
         return []
 
     def save(self):
+        if self.id:
+            columns = self.columns_to_update()
+            if not columns:
+                # Nothing changed since load; skip the write and its row lock
+                return self
         now = datetime.now()
         with db_transaction() as conn:
             with conn.cursor() as cursor:
                 if self.id:
-                    # Update existing user
-                    cursor.execute("""
-                        UPDATE users 
-                        SET username = %s, password = %s, credit_point = %s, email = %s,
-                            phone = %s, firstname = %s, lastname = %s, image = %s,
-                            updated_at = %s, subscription = %s, tenant_id = %s
-                        WHERE id = %s
-                    """, (
-                        self.username, self._password, self.credit_point, self.email,
-                        self.phone, self.firstname, self.lastname, self.image,
-                        now, self.subscription, self.tenant_id, self.id
-                    ))
+                    # Update existing user; only changed columns are written
+                    assignments = ', '.join(f"{column} = %s" for column in columns + ['updated_at'])
+                    cursor.execute(
+                        f"UPDATE users SET {assignments} WHERE id = %s",
+                        [getattr(self, self.attribute_for(column)) for column in columns] + [now, self.id]
+                    )
                 else:
                     # Create new user
                     cursor.execute("""
                         INSERT INTO users (
                             username, password, credit_point, email,
-                            phone, firstname, lastname, image,
+                            phone, firstname, lastname, image, image_key, image_version,
                             created_at, updated_at, subscription, tenant_id
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """, (
                         self.username, self._password, self.credit_point, self.email,
-                        self.phone, self.firstname, self.lastname, self.image,
+                        self.phone, self.firstname, self.lastname, self.image, self.image_key, self.image_version,
                         now, now, self.subscription, self.tenant_id
                     ))
                     self.id = cursor.lastrowid
                     self.created_at = now
                 self.updated_at = now
+        self.mark_clean()
+        forget('User', self.id)
+        model_cache.invalidate('User', self.id)
         return self
 
     def update_credits(self, amount):
@@ -165,8 +283,80 @@ class User:
                 """, (amount, now, self.id))
                 self.credit_point += amount
                 self.updated_at = now
+        # Already written above; a later save() shouldn't write them again
+        self.mark_clean('credit_point', 'updated_at')
+        forget('User', self.id)
+        model_cache.invalidate('User', self.id)
         return self
 
+    @classmethod
+    def update_tenant(cls, tenant_id, name=None, plan=None):
+        """Apply a tenant's name/plan to all of its users with one set-based UPDATE.
+
+        Returns {'matched': users in the tenant, 'updated': rows actually changed}.
+        """
+        assignments, params = [], []
+        if name:
+            assignments.append("username = %s")
+            params.append(name)
+        if plan:
+            # The tenant plan maps to the user's subscription
+            assignments.append("subscription = %s")
+            params.append(plan)
+
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) AS matched FROM users WHERE tenant_id = %s", (tenant_id,))
+                matched = cursor.fetchone()['matched']
+                updated = 0
+                if matched and assignments:
+                    cursor.execute(
+                        f"UPDATE users SET {', '.join(assignments)}, updated_at = %s WHERE tenant_id = %s",
+                        params + [datetime.now(), tenant_id]
+                    )
+                    updated = cursor.rowcount
+        # Any cached user may belong to this tenant
+        forget('User')
+        model_cache.invalidate('User')
+        return {'matched': matched, 'updated': updated}
+
+    @classmethod
+    def reserve_credits(cls, user_id, amount):
+        """Atomically debit amount if the balance covers it.
+
+        Returns the new balance, or None when the user doesn't exist or has
+        too few credits. LAST_INSERT_ID(expr) hands the new balance back in
+        the OK packet, so no follow-up SELECT is needed.
+        """
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE users
+                    SET credit_point = LAST_INSERT_ID(credit_point - %s),
+                        updated_at = %s
+                    WHERE id = %s AND credit_point >= %s
+                """, (amount, datetime.now(), user_id, amount))
+                if cursor.rowcount != 1:
+                    return None
+                balance = cursor.lastrowid
+        forget('User', int(user_id))
+        model_cache.invalidate('User', int(user_id))
+        return balance
+
+    @classmethod
+    def refund_credits(cls, user_id, amount):
+        """Give back credits taken by reserve_credits()"""
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE users
+                    SET credit_point = credit_point + %s,
+                        updated_at = %s
+                    WHERE id = %s
+                """, (amount, datetime.now(), user_id))
+        forget('User', int(user_id))
+        model_cache.invalidate('User', int(user_id))
+
     @staticmethod
     def create_tables():
         """Create necessary tables if they don't exist"""
@@ -183,6 +373,8 @@ class User:
                         firstname VARCHAR(255),
                         lastname VARCHAR(255),
                         image MEDIUMBLOB,
+                        image_key VARCHAR(512),
+                        image_version CHAR(32),
                         subscription VARCHAR(50) DEFAULT 'free',
                         tenant_id VARCHAR(255),
                         created_at DATETIME NOT NULL,
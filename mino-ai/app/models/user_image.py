@@ -0,0 +1,76 @@
+from ..utils.db import db_transaction, db_connection
+from datetime import datetime
+
+
+class UserImage:
+    """A user's profile image renditions, one row per variant.
+
+    Thumbnails are stored as e.g. '64.webp'. With PROFILE_IMAGE_STORAGE=db
+    the original lives here too, as variant 'original'. Every row records
+    the version (MD5) of the original it belongs to, so readers can tell a
+    stale rendition from a current one without the writers of users having
+    to clean up here.
+    """
+    ORIGINAL = 'original'
+
+    @staticmethod
+    def replace(user_id, version, variants):
+        """Store thumbnails ({variant: (content_type, data)}) for version, dropping the previous set"""
+        now = datetime.now()
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM user_images WHERE user_id = %s AND variant <> %s", (user_id, UserImage.ORIGINAL))
+                cursor.executemany("""
+                    INSERT INTO user_images (user_id, variant, version, content_type, data, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [
+                    (user_id, variant, version, content_type, data, now)
+                    for variant, (content_type, data) in variants.items()
+                ])
+
+    @staticmethod
+    def put_original(user_id, version, content_type, data, overwrite=True):
+        """Store the original; with overwrite=False an existing one is kept"""
+        if overwrite:
+            conflict = """ON DUPLICATE KEY UPDATE
+                        version = VALUES(version), content_type = VALUES(content_type),
+                        data = VALUES(data), created_at = VALUES(created_at)"""
+        else:
+            conflict = "ON DUPLICATE KEY UPDATE user_id = user_id"
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    INSERT INTO user_images (user_id, variant, version, content_type, data, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    {conflict}
+                """, (user_id, UserImage.ORIGINAL, version, content_type, data, datetime.now()))
+
+    @staticmethod
+    def get(user_id, variant):
+        """Row dict (version, content_type, data) for one variant, or None"""
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT version, content_type, data FROM user_images
+                    WHERE user_id = %s AND variant = %s
+                """, (user_id, variant))
+                return cursor.fetchone()
+
+    @staticmethod
+    def create_tables():
+        """Create necessary tables if they don't exist"""
+        with db_transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_images (
+                        user_id INT NOT NULL,
+                        variant VARCHAR(16) NOT NULL,
+                        version CHAR(32) NOT NULL,
+                        content_type VARCHAR(32) NOT NULL,
+                        data MEDIUMBLOB NOT NULL,
+                        created_at DATETIME NOT NULL,
+                        PRIMARY KEY (user_id, variant),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
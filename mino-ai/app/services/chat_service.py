@@ -3,6 +3,8 @@ from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
 from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from ..config import Config
+from ..utils import deadline
 # from flask import current_app
 
 class ChatService:
@@ -63,10 +65,12 @@ class ChatService:
             
         if file_id not in self.store:
             qa_prompt = self.qa_prompt_template.format(context=file_summary)
-            self.with_message_history.invoke(
-                [HumanMessage(content=qa_prompt)],
-                config={"configurable": {"session_id": file_id}}
-            )
+            try:
+                self._invoke(qa_prompt, file_id)
+            except deadline.DeadlineExceeded:
+                # Don't keep a session whose context prompt never landed
+                self.clear_context(file_id)
+                raise
     
     def get_response(self, file_id, query):
         """Get a response for a specific file based on the query."""
@@ -91,11 +95,18 @@ class ChatService:
             # Initialize context
             self.initialize_context(file_id, file_summary)
         
-        response = self.with_message_history.invoke(
-            [HumanMessage(content=query)],
-            config={"configurable": {"session_id": file_id}}
-        )
+        response = self._invoke(query, file_id)
         return response.content if response else None
+
+    def _invoke(self, content, session_id):
+        """Call the LLM, giving up at LLM_TIMEOUT_SECONDS or the request deadline, whichever is sooner"""
+        return deadline.call_with_deadline(
+            self.with_message_history.invoke,
+            [HumanMessage(content=content)],
+            config={"configurable": {"session_id": session_id}},
+            default=Config.LLM_TIMEOUT_SECONDS,
+            what='LLM call'
+        )
     
     def clear_context(self, session_id):
         """Clear the context for a specific session."""
@@ -1,36 +1,119 @@
 import os
 import math
 import hashlib
+import tempfile
 import logging
 import json
 from datetime import datetime
 from flask import current_app
 from boto3.s3.transfer import TransferConfig
-import boto3
+from botocore.exceptions import ClientError
 import redis
 from ..models.file import File
 from ..models.user import User
 from ..config import Config
-import markdown
+from ..utils import deadline
+from ..utils.cache import LRUCache, SingleFlight, NegativeCache
+from ..utils.shared_cache import get_cache
+from ..utils.disk_cache import DiskCache
+from ..utils import markdown_html
+import weasyprint
 from weasyprint import HTML, CSS
 
 logger = logging.getLogger(__name__)
 
-# Initialize S3 client
-s3_client = None
+# Parsed summaries keyed by S3 object key, revalidated against the object's ETag
+summary_cache = None
+summary_flight = SingleFlight()
+# Summary keys the pipeline hasn't written yet, so polling clients don't each hit S3
+summary_misses = None
+# Rendered transcript PDFs keyed by pdf_cache_key()
+pdf_cache = None
+pdf_flight = SingleFlight()
+
+TRANSCRIPT_CSS = '''
+            body { 
+                font-family: Arial, sans-serif;
+                margin: 2cm;
+                line-height: 1.6;
+            }
+            h1, h2, h3 { color: #2c5282; }
+            code { 
+                background: #f7fafc;
+                padding: 2px 4px;
+                border-radius: 4px;
+            }
+            pre { 
+                background: #f7fafc;
+                padding: 1em;
+                border-radius: 8px;
+                overflow-x: auto;
+            }
+        '''
+
+TRANSCRIPT_HTML = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+        </head>
+        <body>
+            {html}
+        </body>
+        </html>
+        """
+
+# Changes whenever the stylesheet, page template or renderer does, so old renders stop matching
+PDF_STYLE_VERSION = hashlib.sha256(
+    f"{TRANSCRIPT_CSS}\0{TRANSCRIPT_HTML}\0{markdown_html.RENDERER_VERSION}\0{getattr(weasyprint, '__version__', '')}".encode('utf-8')
+).hexdigest()[:12]
 
 def get_s3_client():
-    """Get or create S3 client"""
-    global s3_client
-    if s3_client is None:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=current_app.config['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=current_app.config['AWS_SECRET_ACCESS_KEY'],
-            region_name=current_app.config['AWS_REGION'],
-            endpoint_url=f"https://s3.{current_app.config['AWS_REGION']}.amazonaws.com"
+    """S3 client whose timeouts fit the current request's remaining deadline"""
+    return deadline.boto_client(
+        's3',
+        aws_access_key_id=current_app.config['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=current_app.config['AWS_SECRET_ACCESS_KEY'],
+        region_name=current_app.config['AWS_REGION'],
+        endpoint_url=f"https://s3.{current_app.config['AWS_REGION']}.amazonaws.com"
+    )
+
+def get_summary_cache():
+    """Get or create the summary cache"""
+    global summary_cache
+    if summary_cache is None:
+        summary_cache = LRUCache(current_app.config.get('SUMMARY_CACHE_MAX_BYTES', 64 * 1024 * 1024), name='summary_cache')
+    return summary_cache
+
+def get_summary_misses():
+    """Get or create the negative cache of not-yet-generated summaries"""
+    global summary_misses
+    if summary_misses is None:
+        summary_misses = NegativeCache(
+            base_delay=current_app.config.get('SUMMARY_MISS_BASE_SECONDS', 2),
+            max_delay=current_app.config.get('SUMMARY_MISS_MAX_SECONDS', 60)
         )
-    return s3_client
+    return summary_misses
+
+def summary_retry_after(file_path):
+    """Seconds until a summary that wasn't there yet is worth checking again, or None"""
+    return get_summary_misses().retry_after(summary_key(file_path))
+
+def get_pdf_cache():
+    """Get or create the rendered-PDF disk cache"""
+    global pdf_cache
+    if pdf_cache is None:
+        directory = current_app.config.get('PDF_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mino-pdf-cache')
+        pdf_cache = DiskCache(directory, current_app.config.get('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024), suffix='.pdf')
+    return pdf_cache
+
+def pdf_cache_key(markdown_text):
+    """Cache key of a transcript PDF: the summary text plus the stylesheet version"""
+    return hashlib.sha256(f"{PDF_STYLE_VERSION}\0{markdown_text}".encode('utf-8')).hexdigest()
+
+def summary_key(file_path):
+    """S3 key of the summary JSON for an uploaded file"""
+    return file_path.rsplit('.', 1)[0] + '_summary.json'
 
 def calculate_file_size_mb(file):
     """Calculate file size in MB"""
@@ -100,40 +183,42 @@ def upload_file_to_s3(file, bucket_name, file_path, user_id):
 def process_file_upload(file, user_id):
     """Process file upload including credit check and database updates"""
     try:
-        # Calculate file size and check credits
+        # Calculate file size and reserve the credits up front in a single conditional
+        # UPDATE, so concurrent uploads can't both spend the same balance
         file_size = calculate_file_size_mb(file)
-        user = User.get_by_id(user_id)
-        
-        if not user:
-            raise ValueError("User not found")
-            
-        if user.credit_point < file_size:
+        credit_remaining = User.reserve_credits(user_id, file_size)
+
+        if credit_remaining is None:
+            if not User.get_by_id(user_id, only=User.EXISTS_FIELDS):
+                raise ValueError("User not found")
             raise ValueError("Insufficient credit points")
 
-        # Generate file path and job ID
-        file_name = file.filename
-        job_id = generate_job_id(file_name, user_id)
-        extension = os.path.splitext(file_name)[1]
-        file_path = f"uploads/{user_id}/{job_id}{extension}"
-        
-        # Upload file to S3
-        bucket_name = current_app.config['S3_UPLOAD_BUCKET']
-        upload_file_to_s3(file, bucket_name, file_path, user_id)
-        
-        # Create file record
-        file_record = File(
-            user_id=user_id,
-            file_name=file_name,
-            file_path=file_path,
-            job_id=job_id,
-            file_size=file_size,
-            processed=True
-        )
-        file_record.save()
-        
-        # Update user credits
-        user.update_credits(-file_size)
-        
+        try:
+            # Generate file path and job ID
+            file_name = file.filename
+            job_id = generate_job_id(file_name, user_id)
+            extension = os.path.splitext(file_name)[1]
+            file_path = f"uploads/{user_id}/{job_id}{extension}"
+
+            # Upload file to S3
+            bucket_name = current_app.config['S3_UPLOAD_BUCKET']
+            upload_file_to_s3(file, bucket_name, file_path, user_id)
+
+            # Create file record
+            file_record = File(
+                user_id=user_id,
+                file_name=file_name,
+                file_path=file_path,
+                job_id=job_id,
+                file_size=file_size,
+                processed=True
+            )
+            file_record.save()
+        except Exception:
+            logger.warning(f"Upload failed, refunding {file_size} credits to user {user_id}")
+            User.refund_credits(user_id, file_size)
+            raise
+
         return {
             'message': 'File uploaded successfully',
             'file_id': file_record.id,
@@ -141,7 +226,7 @@ def process_file_upload(file, user_id):
             'file_path': file_path,
             'file_size': file_size,
             'credit_used': file_size,
-            'credit_remaining': user.credit_point,
+            'credit_remaining': credit_remaining,
             'upload_time': datetime.now().isoformat()
         }
         
@@ -157,35 +242,96 @@ def get_file_summary(file_path):
             return None
 
         # Create summary file path similar to old implementation
-        summary_file_id = file_path.rsplit('.', 1)[0] + '_summary.json'
-        
-        bucket_name = current_app.config['S3_SUMMARY_BUCKET']
-        logger.info(f"Fetching summary file for key: {summary_file_id}")
-        
-        s3 = get_s3_client()
-        file_obj = s3.get_object(Bucket=bucket_name, Key=summary_file_id)
-        summary_json = json.loads(file_obj['Body'].read().decode('utf-8'))
-        
-        return summary_json
+        summary_file_id = summary_key(file_path)
+
+        # Recently fetched or written summaries are trusted without asking S3
+        entry = get_summary_cache().get(summary_file_id)
+        if entry is not None and entry.age() < current_app.config.get('SUMMARY_CACHE_FRESH_SECONDS', 30):
+            return entry.value
+
+        retry_after = get_summary_misses().retry_after(summary_file_id)
+        if retry_after:
+            logger.debug(f"Summary {summary_file_id} not generated yet, next check in {retry_after:.1f}s")
+            return None
+
+        # Concurrent requests for the same summary share one S3 call
+        return summary_flight.do(summary_file_id, _fetch_summary, summary_file_id, entry)
 
     except Exception as e:
         logger.error(f"Error getting file summary: {str(e)}")
         return None
-    
+
+def _shared_summary_cache():
+    # The byte-bounded LRU already is the per-process tier; only Redis adds anything
+    return get_cache('summary') if current_app.config.get('CACHE_BACKEND') == 'redis' else None
+
+def _fetch_summary(summary_file_id, entry):
+    """GET the summary from S3, or only revalidate the cached copy when we have its ETag"""
+    shared = _shared_summary_cache()
+    if entry is None and shared is not None:
+        # Another worker (or container) may already have fetched it
+        cached = shared.get(summary_file_id)
+        if cached is not None:
+            get_summary_cache().set(summary_file_id, cached['summary'], cached['size'], cached['etag'])
+            return cached['summary']
+
+    bucket_name = current_app.config['S3_SUMMARY_BUCKET']
+    logger.info(f"Fetching summary file for key: {summary_file_id}")
+
+    params = {'Bucket': bucket_name, 'Key': summary_file_id}
+    if entry is not None and entry.etag:
+        params['IfNoneMatch'] = entry.etag
+
+    s3 = get_s3_client()
+    try:
+        file_obj = s3.get_object(**params)
+    except ClientError as e:
+        if entry is not None and e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            get_summary_cache().touch(summary_file_id)
+            return entry.value
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            # Still being generated by the pipeline; not an error
+            delay = get_summary_misses().miss(summary_file_id)
+            logger.info(f"Summary {summary_file_id} not generated yet, next check in {delay}s")
+            return None
+        raise
+
+    body = file_obj['Body'].read()
+    summary_json = json.loads(body.decode('utf-8'))
+    _remember_summary(summary_file_id, summary_json, len(body), file_obj.get('ETag'))
+    return summary_json
+
+def _remember_summary(summary_file_id, summary_json, size, etag):
+    """Store a summary in this worker's LRU and, with Redis, the shared cache"""
+    get_summary_cache().set(summary_file_id, summary_json, size, etag)
+    get_summary_misses().clear(summary_file_id)
+    shared = _shared_summary_cache()
+    if shared is not None:
+        shared.set(summary_file_id, {'summary': summary_json, 'size': size, 'etag': etag})
+
 def save_edited_file(file_path, edited_content):
     """Save edited content to a file in S3"""
     try:
         bucket_name = current_app.config['S3_SUMMARY_BUCKET']
-        summary_file_id = file_path.rsplit('.', 1)[0] + '_summary.json'
-        
+        summary_file_id = summary_key(file_path)
+        summary_json = {'summary': edited_content}
+        body = json.dumps(summary_json).encode('utf-8')
+
         s3 = get_s3_client()
-        s3.put_object(
+        response = s3.put_object(
             Bucket=bucket_name,
             Key=summary_file_id,
-            Body=json.dumps({'summary': edited_content}).encode('utf-8'),
+            Body=body,
             ContentType='application/json'
         )
-        
+        # The PDF of the summary being replaced will never be asked for again
+        previous = get_summary_cache().get(summary_file_id)
+        if previous is not None and isinstance(previous.value, dict) and 'summary' in previous.value:
+            invalidate_transcript_pdf(str(previous.value['summary']))
+
+        # Write-through, so the next read doesn't go back to S3
+        _remember_summary(summary_file_id, summary_json, len(body), response.get('ETag'))
+
         logger.info(f"Successfully saved edited file to S3: {file_path}")
         return True
         
@@ -217,43 +363,15 @@ def markdown_to_pdf(markdown_text):
     try:
         logger.info("Starting markdown to PDF conversion")
         
-        # Convert markdown to HTML
-        html = markdown.markdown(markdown_text)
+        # Convert markdown to HTML (shared with the summary HTML endpoint)
+        html, _ = markdown_html.render(markdown_text)
         logger.debug(f"Generated HTML length: {len(html)} characters")
         
         # Add some basic styling
-        css = CSS(string='''
-            body { 
-                font-family: Arial, sans-serif;
-                margin: 2cm;
-                line-height: 1.6;
-            }
-            h1, h2, h3 { color: #2c5282; }
-            code { 
-                background: #f7fafc;
-                padding: 2px 4px;
-                border-radius: 4px;
-            }
-            pre { 
-                background: #f7fafc;
-                padding: 1em;
-                border-radius: 8px;
-                overflow-x: auto;
-            }
-        ''')
+        css = CSS(string=TRANSCRIPT_CSS)
         
         # Wrap HTML in proper structure
-        full_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-        </head>
-        <body>
-            {html}
-        </body>
-        </html>
-        """
+        full_html = TRANSCRIPT_HTML.format(html=html)
         
         logger.debug("Generating PDF...")
         # Generate PDF in memory
@@ -298,8 +416,72 @@ def markdown_to_pdf(markdown_text):
 #             os.unlink(pdf_path)
 #         return None
 
+def _pdf_s3_key(cache_key):
+    return f"{current_app.config.get('PDF_CACHE_S3_PREFIX', 'transcript-cache/')}{cache_key}.pdf"
+
+def render_transcript_pdf(markdown_text):
+    """Path of the rendered PDF for markdown_text, or None if rendering failed.
+
+    Looks in the local disk cache, then the optional S3 tier
+    (PDF_CACHE_S3_BUCKET), and only then runs WeasyPrint. Concurrent
+    requests for the same PDF share one render.
+    """
+    cache_key = pdf_cache_key(markdown_text)
+    path = get_pdf_cache().get(cache_key)
+    if path is not None:
+        logger.info(f"Serving cached transcript PDF {cache_key}")
+        return path
+    return pdf_flight.do(cache_key, _build_transcript_pdf, cache_key, markdown_text)
+
+def _build_transcript_pdf(cache_key, markdown_text):
+    cache = get_pdf_cache()
+    bucket_name = current_app.config.get('PDF_CACHE_S3_BUCKET')
+    if bucket_name:
+        try:
+            file_obj = get_s3_client().get_object(Bucket=bucket_name, Key=_pdf_s3_key(cache_key))
+            logger.info(f"Transcript PDF {cache_key} found in S3 cache")
+            return cache.put(cache_key, file_obj['Body'].read())
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                logger.warning(f"Error reading PDF cache from S3: {str(e)}")
+
+    pdf_bytes = markdown_to_pdf(markdown_text)
+    if not pdf_bytes:
+        return None
+    path = cache.put(cache_key, pdf_bytes)
+
+    if bucket_name:
+        try:
+            get_s3_client().put_object(
+                Bucket=bucket_name,
+                Key=_pdf_s3_key(cache_key),
+                Body=pdf_bytes,
+                ContentType='application/pdf'
+            )
+        except Exception as e:
+            logger.warning(f"Error writing PDF cache to S3: {str(e)}")
+    return path
+
+def invalidate_transcript_pdf(markdown_text):
+    """Drop the cached PDF of a summary (local disk and S3 tier)"""
+    try:
+        cache_key = pdf_cache_key(markdown_text)
+        get_pdf_cache().delete(cache_key)
+        bucket_name = current_app.config.get('PDF_CACHE_S3_BUCKET')
+        if bucket_name:
+            get_s3_client().delete_object(Bucket=bucket_name, Key=_pdf_s3_key(cache_key))
+    except Exception as e:
+        logger.warning(f"Error invalidating cached transcript PDF: {str(e)}")
+
+def get_summary_html(file_path):
+    """Sanitized HTML of a file's summary and its content hash, or (None, None)"""
+    summary = get_file_summary(file_path)
+    if not summary or 'summary' not in summary:
+        return None, None
+    return markdown_html.render(str(summary['summary']))
+
 def get_transcript_pdf(file_id, user_id):
-    """Get transcript PDF for a file"""
+    """Get transcript PDF for a file. Returns (pdf path, file name) or (None, error)"""
     try:
         # Get the file record
         file = File.get_by_id(file_id)
@@ -315,13 +497,13 @@ def get_transcript_pdf(file_id, user_id):
             
         logger.info(f"Got summary of length {len(str(summary))} characters")
         
-        # Convert summary to PDF
-        pdf_bytes = markdown_to_pdf(str(summary['summary']))
-        if not pdf_bytes:
+        # Convert summary to PDF (or reuse an earlier render of the same text)
+        pdf_path = render_transcript_pdf(str(summary['summary']))
+        if not pdf_path:
             logger.error("PDF generation failed")
             return None, "Failed to convert summary to PDF"
             
-        return pdf_bytes, file.file_name
+        return pdf_path, file.file_name
             
     except Exception as e:
         logger.error(f"Error generating transcript PDF: {str(e)}")
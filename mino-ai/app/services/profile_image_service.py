@@ -0,0 +1,147 @@
+import time
+import hashlib
+import logging
+from flask import current_app
+from ..models.user import User
+from ..models.user_image import UserImage
+from ..utils.db import use_primary
+from ..utils.file import get_s3_client, load_image, get_image_format, IMAGE_MIME_TYPES
+from ..utils import thumbnails
+
+logger = logging.getLogger(__name__)
+
+# image_key of originals kept in the user_images table (PROFILE_IMAGE_STORAGE=db)
+DB_IMAGE_KEY = 'db:original'
+
+# Object keys embed the version, so an object never changes once written
+S3_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _storage():
+    return current_app.config.get('PROFILE_IMAGE_STORAGE', 's3')
+
+
+def _s3_location(user_id, version, format):
+    bucket = current_app.config.get('PROFILE_IMAGE_BUCKET') or current_app.config['S3_UPLOAD_BUCKET']
+    prefix = current_app.config.get('PROFILE_IMAGE_PREFIX', 'profile-images/')
+    return bucket, f"{prefix}{user_id}/{version}.{format}"
+
+
+def store_original(user_id, image_data, overwrite=True):
+    """Write an original to the configured storage. Returns (image_key, version).
+
+    overwrite=False keeps an original already in user_images, so the backfill
+    can't replace an image uploaded while it ran.
+    """
+    version = hashlib.md5(image_data).hexdigest()
+    format = get_image_format(image_data[:16]) or 'jpg'
+    mime_type = IMAGE_MIME_TYPES[format]
+    if _storage() == 'db':
+        UserImage.put_original(user_id, version, mime_type, image_data, overwrite=overwrite)
+        return DB_IMAGE_KEY, version
+    bucket, key = _s3_location(user_id, version, format)
+    get_s3_client().put_object(
+        Bucket=bucket, Key=key, Body=image_data,
+        ContentType=mime_type, CacheControl=S3_CACHE_CONTROL
+    )
+    return f"s3://{bucket}/{key}", version
+
+
+def delete_original(user_id, image_key):
+    """Best-effort removal of a replaced original"""
+    if not image_key or not image_key.startswith('s3://'):
+        # The db original is overwritten in place
+        return
+    bucket, _, key = image_key[len('s3://'):].partition('/')
+    try:
+        get_s3_client().delete_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        logger.warning(f"Failed to delete replaced profile image {image_key} of user {user_id}: {str(e)}")
+
+
+def load_original(user_id):
+    """(bytes, mime type) of a user's original image, or (None, None).
+
+    Reads both layouts while the backfill runs: users with an image_key are
+    read from S3 or user_images; the rest from the legacy image column.
+    The image column is NULL for moved users, so selecting it costs nothing.
+    """
+    user = User.get_by_id(user_id, only=('image_key', 'image'))
+    if not user:
+        return None, None
+    if user.image_key == DB_IMAGE_KEY:
+        row = UserImage.get(user_id, UserImage.ORIGINAL)
+        return (row['data'], row['content_type']) if row else (None, None)
+    if user.image_key:
+        return load_image(user.image_key)
+    return load_image(user.image)
+
+
+def save_profile_image(user, image_data):
+    """Store a new profile image for user: original, users row, then thumbnails.
+
+    Raises thumbnails.InvalidImage if the data doesn't decode. Returns the
+    new image version.
+    """
+    variants = thumbnails.make_thumbnails(image_data)
+    previous_key = user.image_key
+    image_key, version = store_original(user.id, image_data)
+
+    user.image_key = image_key
+    user.image_version = version
+    # Drop any legacy copy in the column
+    user.image = None
+    user.save()
+
+    UserImage.replace(user.id, version, variants)
+    if previous_key != image_key:
+        delete_original(user.id, previous_key)
+    return version
+
+
+def clear_profile_image(user):
+    previous_key = user.image_key
+    user.image_key = None
+    user.image_version = None
+    user.image = None
+    user.save()
+    delete_original(user.id, previous_key)
+
+
+def backfill(batch_size=100, pause=0.5, limit=None):
+    """Move legacy images out of users.image into the configured storage.
+
+    Walks users by id in batches, pausing between batches so replicas keep
+    up. A user whose image column changes while being moved is skipped (the
+    new write already went through save_profile_image, or the next run picks
+    it up), and a copy already in storage is never overwritten. Safe to
+    interrupt and re-run. Returns the number of images moved.
+    """
+    moved = skipped = 0
+    last_id = 0
+    while limit is None or moved < limit:
+        rows = User.get_legacy_image_batch(last_id, batch_size)
+        if not rows:
+            break
+        for row in rows:
+            last_id = row['id']
+            raw = row['image']
+            image_data, _ = load_image(raw)
+            if image_data is None:
+                logger.warning(f"Skipping user {row['id']}: stored image could not be read")
+                skipped += 1
+                continue
+            image_key, version = store_original(row['id'], image_data, overwrite=False)
+            if User.move_legacy_image(row['id'], image_key, version, hashlib.md5(raw).hexdigest()):
+                moved += 1
+                continue
+            logger.info(f"Image of user {row['id']} changed during backfill; leaving it")
+            skipped += 1
+            # Remove the orphaned copy, unless a concurrent upload of the same image now uses it
+            with use_primary():
+                current_version = User.get_image_version(row['id'])
+            if current_version != version:
+                delete_original(row['id'], image_key)
+        logger.info(f"Profile image backfill: {moved} moved, {skipped} skipped, last id {last_id}")
+        time.sleep(pause)
+    return moved
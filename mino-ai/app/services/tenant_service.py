@@ -1,6 +1,7 @@
 import requests
 import logging
 from ..config import Config
+from ..utils import deadline
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +44,7 @@ def create_tenant_for_user(user_id: int, username: str, email: str) -> int:
             url,
             json=payload,
             headers={"Content-Type": "application/json"},
-            timeout=10
+            timeout=deadline.timeout(10, 'tenant service')
         )
         
         if response.status_code == 201:
@@ -1,6 +1,7 @@
 import requests
 import logging
 from requests.exceptions import RequestException, ConnectionError, Timeout
+from ..utils import deadline
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ def sync_update_tenant(tenant_id, name=None, domain=None, plan=None):
         url = f"{AGENTIC_BASE_URL}/{tenant_id}"
         # Use a session with proper connection handling
         session = requests.Session()
-        response = session.put(url, json=payload, timeout=5)
+        response = session.put(url, json=payload, timeout=deadline.timeout(5, 'tenant sync'))
 
         if response.status_code == 200:
             return True
@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from . import deadline
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    __slots__ = ('value', 'size', 'etag', 'stored_at')
+
+    def __init__(self, value, size, etag=None):
+        self.value = value
+        self.size = size
+        self.etag = etag
+        self.stored_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by the total size of its entries.
+
+    Callers pass each value's size (e.g. the byte length of the payload it
+    was parsed from); least recently used entries are evicted once the total
+    would exceed max_bytes. Values bigger than max_bytes are not cached.
+    """
+
+    def __init__(self, max_bytes, name='cache'):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The entry for key (marked most recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, value, size, etag=None):
+        entry = CacheEntry(value, size, etag)
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                logger.debug(f"{self.name}: {key} ({size} bytes) is larger than the cache, not stored")
+                return entry
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def touch(self, key):
+        """Reset an entry's age after it was revalidated"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    The first caller runs fn; callers arriving while it is in flight wait for
+    it and get the same result (or exception) instead of repeating the work.
+    Waiters give up when the request deadline runs out.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(deadline.timeout(None, 'coalesced call')):
+                deadline.mark_exceeded()
+                raise deadline.DeadlineExceeded(f"Timed out waiting on in-flight call for {key}")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn(*args, **kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class NegativeCache:
+    """Remembers keys that were missing, backing off exponentially per key.
+
+    After the nth consecutive miss the key is reported missing, without
+    checking the backend, for base * 2**(n-1) seconds (capped at max_delay).
+    A key whose backoff ran out long ago starts over; the oldest keys are
+    dropped beyond max_entries.
+    """
+
+    def __init__(self, base_delay=2, max_delay=60, max_entries=10000):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (consecutive misses, retry at)
+        self._lock = threading.Lock()
+
+    def miss(self, key):
+        """Record a miss; returns the seconds until the key is worth checking again"""
+        now = time.monotonic()
+        with self._lock:
+            misses, retry_at = self._entries.pop(key, (0, now))
+            if now - retry_at > self.max_delay:
+                misses = 0
+            misses += 1
+            delay = min(self.base_delay * 2 ** (misses - 1), self.max_delay)
+            self._entries[key] = (misses, now + delay)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return delay
+
+    def retry_after(self, key):
+        """Seconds left in key's backoff, or None when it should be checked"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        left = entry[1] - time.monotonic()
+        return left if left > 0 else None
+
+    def clear(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
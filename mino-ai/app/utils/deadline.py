@@ -0,0 +1,182 @@
+import re
+import time
+import logging
+import threading
+from flask import g, request, jsonify, has_request_context
+
+logger = logging.getLogger(__name__)
+
+# Read timeouts S3 clients are built with; a call gets the largest one that fits the
+# remaining budget, so we keep a handful of clients instead of one per request
+TIMEOUT_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300)
+MIN_TIMEOUT = 0.05
+
+_SELECT_RE = re.compile(r'^\s*SELECT\b', re.I)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before (or while) calling a dependency"""
+
+
+def request_deadline(seconds):
+    """Per-route time budget; apply it below @route. REQUEST_DEADLINES overrides it by endpoint"""
+    def decorator(view):
+        view._request_deadline = seconds
+        return view
+    return decorator
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None outside a request"""
+    if not has_request_context():
+        return None
+    deadline = g.get('_deadline')
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(what='request'):
+    """Fail fast once the budget is gone instead of starting more work"""
+    left = remaining()
+    if left is not None and left <= 0:
+        mark_exceeded()
+        raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+
+def timeout(default, what='call'):
+    """The smaller of default and the remaining budget; raises if nothing is left"""
+    check(what)
+    left = remaining()
+    if left is None:
+        return default
+    return max(MIN_TIMEOUT, min(default, left)) if default else max(MIN_TIMEOUT, left)
+
+
+def limit_select(query):
+    """Add a MAX_EXECUTION_TIME hint to a SELECT so MySQL stops it when the budget runs out"""
+    left = remaining()
+    if left is None or not isinstance(query, str) or not _SELECT_RE.match(query):
+        return query
+    if 'MAX_EXECUTION_TIME' in query:
+        return query
+    check('query')
+    milliseconds = max(1, int(left * 1000))
+    return _SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */", query, count=1)
+
+
+def mark_exceeded():
+    """Record that the deadline was the cause of a failure (so a 500 becomes a 504)"""
+    if has_request_context():
+        g._deadline_hit = True
+
+
+def _bucket(seconds):
+    fitting = [bucket for bucket in TIMEOUT_BUCKETS if bucket <= seconds]
+    return fitting[-1] if fitting else TIMEOUT_BUCKETS[0]
+
+
+def boto_client(service, read_timeout=60, **client_kwargs):
+    """boto3 client whose read timeout fits the remaining budget.
+
+    Clients are cached per (service, settings, timeout bucket), so a request
+    with 4s left gets the 2s client and never waits past its deadline on a
+    read.
+    """
+    import boto3
+    from botocore.config import Config as BotoConfig
+
+    bucket = _bucket(timeout(read_timeout, service))
+    key = (service, tuple(sorted(client_kwargs.items())), bucket)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = boto3.client(
+                    service,
+                    config=BotoConfig(
+                        connect_timeout=min(bucket, 5),
+                        read_timeout=bucket,
+                        retries={'max_attempts': 2 if bucket < 10 else 3}
+                    ),
+                    **client_kwargs
+                )
+    return client
+
+
+def call_with_deadline(func, *args, default=None, what='call', **kwargs):
+    """Run a blocking call that has no timeout knob of its own, giving up when the budget does.
+
+    The call keeps running in its worker thread after we give up; only the
+    request stops waiting on it.
+    """
+    wait = timeout(default, what)
+    result = {}
+    done = threading.Event()
+
+    def run():
+        try:
+            result['value'] = func(*args, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=run, daemon=True, name=f"deadline-{what}").start()
+    if not done.wait(wait):
+        mark_exceeded()
+        raise DeadlineExceeded(f"{what} did not finish within {wait:.2f}s")
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+def _budget_for(app):
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    seconds = app.config.get('REQUEST_DEADLINES', {}).get(
+        request.endpoint, getattr(view, '_request_deadline', app.config.get('REQUEST_DEADLINE_SECONDS', 30)))
+
+    header = request.headers.get(app.config.get('REQUEST_DEADLINE_HEADER', 'X-Request-Timeout-Ms'))
+    if header:
+        try:
+            requested = float(header) / 1000
+        except ValueError:
+            logger.warning(f"Ignoring malformed deadline header: {header}")
+        else:
+            # Callers can only tighten the route's budget; on routes without one the cap applies
+            if requested > 0:
+                seconds = min(requested, seconds or app.config.get('REQUEST_DEADLINE_MAX_SECONDS', 120))
+    return seconds
+
+
+def _timeout_response():
+    return jsonify({'error': 'Request deadline exceeded'}), 504
+
+
+def init_app(app):
+    """Start every request's deadline clock and map exhausted budgets to 504"""
+
+    @app.before_request
+    def _start_deadline():
+        seconds = _budget_for(app)
+        if seconds:
+            g._deadline = time.monotonic() + seconds
+
+    @app.errorhandler(DeadlineExceeded)
+    def _deadline_exceeded(error):
+        logger.warning(f"{request.method} {request.path}: {str(error)}")
+        return _timeout_response()
+
+    @app.after_request
+    def _deadline_status(response):
+        # Most views catch Exception and answer 500; if the real cause was the
+        # deadline, say so
+        if g.get('_deadline_hit') and response.status_code >= 500 and response.status_code != 504:
+            logger.warning(f"{request.method} {request.path}: deadline exceeded, returning 504")
+            response, status = _timeout_response()
+            response.status_code = status
+        return response
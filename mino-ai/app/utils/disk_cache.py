@@ -0,0 +1,109 @@
+import os
+import re
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+_KEY_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class DiskCache:
+    """Size-bounded directory of cached artifacts, one file per key.
+
+    A hit bumps the file's mtime, and once the directory grows past
+    max_bytes the files with the oldest mtime are removed, so it behaves as
+    an LRU that survives restarts. Writes go to a temp file first and are
+    renamed into place, so readers never see a partial file.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._files())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key):
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid cache key: {key}")
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Path of the cached file for key, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, data):
+        """Store data under key and return its path"""
+        path = self.path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with self._lock:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(temp_path, path)
+                self._bytes += len(data) - previous
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        if self._bytes > self.max_bytes:
+            self._evict(keep=path)
+        return path
+
+    def delete(self, key):
+        path = self.path(key)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.unlink(path)
+                self._bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def _files(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.tmp-'):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self, keep=None):
+        with self._lock:
+            # Re-scan: other workers may share the directory
+            files = sorted(self._files(), key=lambda item: item[2])
+            self._bytes = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if self._bytes <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                    self._bytes -= size
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+        logger.debug(f"Disk cache {self.directory} trimmed to {self._bytes} bytes")
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -1,27 +1,95 @@
 import base64
 import os
 import logging
-import boto3
 from flask import current_app
 from ..models.file import File
+from . import deadline
 
 logger = logging.getLogger(__name__)
 
-# Initialize S3 client
-s3_client = None
-
 def get_s3_client():
-    """Get or create S3 client"""
-    global s3_client
-    if s3_client is None:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=current_app.config['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=current_app.config['AWS_SECRET_ACCESS_KEY'],
-            region_name=current_app.config['AWS_REGION'],
-            endpoint_url=f"https://s3.{current_app.config['AWS_REGION']}.amazonaws.com"
-        )
-    return s3_client
+    """S3 client whose timeouts fit the current request's remaining deadline"""
+    return deadline.boto_client(
+        's3',
+        aws_access_key_id=current_app.config['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=current_app.config['AWS_SECRET_ACCESS_KEY'],
+        region_name=current_app.config['AWS_REGION'],
+        endpoint_url=f"https://s3.{current_app.config['AWS_REGION']}.amazonaws.com"
+    )
+
+IMAGE_MIME_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+}
+
+def get_image_format(header):
+    """Detect image format from file header (magic bytes)"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    elif header.startswith(b'\x89PNG'):
+        return 'png'
+    elif header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):
+        return 'gif'
+    elif header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+        return 'webp'
+    else:
+        return None
+
+def load_image(image_data_or_path):
+    """Raw bytes and MIME type of a stored profile image, or (None, None).
+
+    The image column holds the image itself (BLOB), a data: URL (set through
+    PUT /profile), or a path: s3://bucket/key or relative to the app root.
+    """
+    if not image_data_or_path:
+        return None, None
+
+    # Strings stored in the BLOB column come back as bytes
+    if isinstance(image_data_or_path, (bytes, bytearray)) and image_data_or_path[:5] in (b'data:', b's3://'):
+        image_data_or_path = bytes(image_data_or_path).decode('utf-8')
+
+    # If input is binary data
+    if isinstance(image_data_or_path, (bytes, bytearray)):
+        image_data = bytes(image_data_or_path)
+        format = get_image_format(image_data[:16])
+        if not format:
+            logger.error("Could not determine image format from binary data")
+            return None, None
+        return image_data, IMAGE_MIME_TYPES[format]
+
+    image_path = image_data_or_path
+    if image_path.startswith('data:'):
+        header, _, encoded = image_path.partition(',')
+        mime_type = header[5:].split(';')[0] or 'image/jpeg'
+        return base64.b64decode(encoded), mime_type
+
+    # Handle S3 paths
+    if image_path.startswith('s3://'):
+        # Parse bucket and key from s3 path
+        path_parts = image_path.replace('s3://', '').split('/')
+        bucket = path_parts[0]
+        key = '/'.join(path_parts[1:])
+
+        # Get file from S3
+        s3 = get_s3_client()
+        response = s3.get_object(Bucket=bucket, Key=key)
+        image_data = response['Body'].read()
+    else:
+        # Handle local files
+        full_path = os.path.join(current_app.root_path, image_path)
+        if not os.path.exists(full_path):
+            logger.warning(f"Image file not found: {full_path}")
+            return None, None
+
+        with open(full_path, 'rb') as image_file:
+            image_data = image_file.read()
+
+    # Get file extension for mime type
+    ext = os.path.splitext(image_path)[1].lower().lstrip('.')
+    return image_data, IMAGE_MIME_TYPES.get(ext, 'image/jpeg')
 
 def get_base64_image(image_data_or_path):
     """Convert image to base64 string
@@ -29,58 +97,9 @@ def get_base64_image(image_data_or_path):
         image_data_or_path: Either a file path string or binary image data
     """
     try:
-        if not image_data_or_path:
+        image_data, mime_type = load_image(image_data_or_path)
+        if image_data is None:
             return None
-            
-        # If input is binary data
-        if isinstance(image_data_or_path, bytes):
-            image_data = image_data_or_path
-            # Detect mime type from binary data
-            import imghdr
-            format = imghdr.what(None, image_data)
-            if not format:
-                logger.error("Could not determine image format from binary data")
-                return None
-            mime_type = f'image/{format if format != "jpeg" else "jpg"}'
-        else:
-            # Handle file paths (S3 or local)
-            image_path = image_data_or_path
-            
-            # Handle S3 paths
-            if image_path.startswith('s3://'):
-                # Parse bucket and key from s3 path
-                path_parts = image_path.replace('s3://', '').split('/')
-                bucket = path_parts[0]
-                key = '/'.join(path_parts[1:])
-                
-                # Get file from S3
-                s3 = get_s3_client()
-                response = s3.get_object(Bucket=bucket, Key=key)
-                image_data = response['Body'].read()
-            else:
-                # Handle local files
-                full_path = os.path.join(current_app.root_path, image_path)
-                if not os.path.exists(full_path):
-                    logger.warning(f"Image file not found: {full_path}")
-                    return None
-                    
-                with open(full_path, 'rb') as image_file:
-                    image_data = image_file.read()
-
-            # Get file extension for mime type
-            ext = os.path.splitext(image_path)[1].lower()
-            if ext.startswith('.'):
-                ext = ext[1:]
-                
-            # Map extension to mime type
-            mime_types = {
-                'png': 'image/png',
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'gif': 'image/gif',
-                'webp': 'image/webp'
-            }
-            mime_type = mime_types.get(ext, 'image/jpeg')
 
         # Convert to base64
         base64_encoded = base64.b64encode(image_data).decode('utf-8')
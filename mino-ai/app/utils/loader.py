@@ -0,0 +1,81 @@
+import logging
+from flask import g, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+class DataLoader:
+    """Per-request batching and memoization of lookups by key.
+
+    batch_fn takes a list of keys and returns {key: value} for the ones that
+    exist. Keys announced with want() are fetched together with the next
+    load() that misses the cache, so a caller that knows it will need N rows
+    issues one query instead of N. Loaded values (including misses) are
+    memoized for the rest of the request.
+    """
+
+    def __init__(self, batch_fn, name=None):
+        self.batch_fn = batch_fn
+        self.name = name or getattr(batch_fn, '__qualname__', 'loader')
+        self._cache = {}
+        self._queue = []
+        self.batches = 0
+
+    def want(self, *keys):
+        """Queue keys to be fetched with the next batch"""
+        for key in keys:
+            if key not in self._cache and key not in self._queue:
+                self._queue.append(key)
+        return self
+
+    def dispatch(self):
+        """Fetch every queued key in one batch"""
+        keys, self._queue = self._queue, []
+        if not keys:
+            return
+        found = self.batch_fn(keys)
+        self.batches += 1
+        logger.debug(f"{self.name} loaded {len(found)}/{len(keys)} key(s) in one batch")
+        for key in keys:
+            self._cache[key] = found.get(key)
+
+    def load(self, key):
+        if key not in self._cache:
+            self.want(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        self.want(*keys)
+        self.dispatch()
+        return [self._cache[key] for key in keys]
+
+    def prime(self, key, value):
+        self._cache[key] = value
+
+    def clear(self, key=None):
+        """Forget one key (after it was written) or everything"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+def get_loader(name, batch_fn):
+    """The request-scoped DataLoader registered under name, or None outside a request/app context"""
+    if not has_app_context():
+        return None
+    loaders = g.setdefault('_data_loaders', {})
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = DataLoader(batch_fn, name=name)
+    return loader
+
+
+def forget(name, key=None):
+    """Drop a cached key from the request's loader (no-op when there is none)"""
+    if not has_app_context():
+        return
+    loader = g.get('_data_loaders', {}).get(name)
+    if loader is not None:
+        loader.clear(key)
@@ -0,0 +1,102 @@
+import re
+import html
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+import markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+from flask import current_app, has_app_context
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# The parts of 'extra' we use; its attr_list would let authors set arbitrary
+# attributes ({: onclick=... }) on any element
+EXTENSIONS = ('abbr', 'def_list', 'fenced_code', 'footnotes', 'tables', 'sane_lists')
+EXTENSION_CONFIGS = {'tables': {'use_align_attribute': True}}
+# Everything else is removed from the rendered tree, whatever produced it
+SAFE_ATTRIBUTES = {'href', 'src', 'alt', 'title', 'rel', 'id', 'class', 'start', 'colspan', 'align'}
+SAFE_URL_SCHEMES = {'', 'http', 'https', 'mailto'}
+# Browsers drop these anywhere in a URL before reading its scheme ("java\tscript:")
+_URL_IGNORED_CHARS = re.compile(r'[\x00-\x20\x7f]+')
+
+# Bump when the conversion changes (extensions, sanitizing), so memoized HTML and ETags turn over
+RENDERER_VERSION = f"3:{markdown.__version__}:{','.join(EXTENSIONS)}"
+
+_local = threading.local()
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def url_scheme(value):
+    """The scheme a browser would see in an attribute value: entities decoded,
+    control characters and whitespace removed"""
+    return urlparse(_URL_IGNORED_CHARS.sub('', html.unescape(value))).scheme.lower()
+
+
+class _SafeUrls(Treeprocessor):
+    """Drops attributes outside SAFE_ATTRIBUTES (event handlers, style) and
+    href/src values with a scheme other than http(s)/mailto (javascript:, data:, ...)"""
+
+    def run(self, root):
+        for element in root.iter():
+            for attribute in [name for name in element.attrib if name.lower() not in SAFE_ATTRIBUTES]:
+                del element.attrib[attribute]
+            for attribute in ('href', 'src'):
+                value = element.get(attribute)
+                if value is not None and url_scheme(value) not in SAFE_URL_SCHEMES:
+                    del element.attrib[attribute]
+            if element.tag == 'a' and element.get('href'):
+                element.set('rel', 'nofollow noopener')
+
+
+class SanitizeExtension(Extension):
+    """Treat raw HTML in the markdown as text and strip unsafe attributes and link targets"""
+
+    def extendMarkdown(self, md):
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+        md.treeprocessors.register(_SafeUrls(md), 'safe_urls', 0)
+
+
+def _parser():
+    # Markdown instances keep per-document state, so each thread (greenlet under
+    # eventlet) gets its own, built once and reset between documents
+    md = getattr(_local, 'md', None)
+    if md is None:
+        md = _local.md = markdown.Markdown(
+            extensions=list(EXTENSIONS) + [SanitizeExtension()], extension_configs=EXTENSION_CONFIGS)
+    return md
+
+
+def _memo_cache():
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                max_bytes = 16 * 1024 * 1024
+                if has_app_context():
+                    max_bytes = current_app.config.get('MARKDOWN_CACHE_MAX_BYTES', max_bytes)
+                _memo = LRUCache(max_bytes, name='markdown_html')
+    return _memo
+
+
+def content_hash(text):
+    return hashlib.sha256(f"{RENDERER_VERSION}\0{text}".encode('utf-8')).hexdigest()
+
+
+def render(text):
+    """Sanitized HTML for markdown text, memoized by content hash. Returns (html, hash)"""
+    digest = content_hash(text)
+    entry = _memo_cache().get(digest)
+    if entry is not None:
+        return entry.value, digest
+    md = _parser()
+    try:
+        html = md.convert(text)
+    finally:
+        md.reset()
+    _memo_cache().set(digest, html, len(html.encode('utf-8')))
+    return html, digest
@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from datetime import datetime
+from .db import db_connection
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+
+# Errors that mean a statement's effect is already in place (the schema was created by
+# create_tables() or by hand before the runner existed), so re-running it is a no-op
+ALREADY_APPLIED_ERRORS = {
+    1050,  # Table already exists
+    1060,  # Duplicate column name
+    1061,  # Duplicate key name
+    1091,  # Can't DROP; check that column/key exists
+}
+
+# Queries on request hot paths; `explain` prints their plans so a missing index shows up
+HOT_QUERIES = {
+    'User.get_by_username': (
+        "SELECT id, username FROM users WHERE username = %s", ('user',)),
+    'User.get_by_email': (
+        "SELECT id, email FROM users WHERE email = %s", ('user@example.com',)),
+    'User.get_by_tenant_id': (
+        "SELECT id FROM users WHERE tenant_id = %s", ('tenant',)),
+    'File.get_user_files_page': (
+        "SELECT id, file_name, file_path, upload_time, processed FROM user_files WHERE user_id = %s "
+        "ORDER BY upload_time DESC, id DESC LIMIT %s", (0, 51)),
+    'File.get_user_files_page(cursor)': (
+        "SELECT id, file_name, file_path, upload_time, processed FROM user_files WHERE user_id = %s "
+        "AND (upload_time < %s OR (upload_time = %s AND id < %s)) ORDER BY upload_time DESC, id DESC LIMIT %s",
+        (0, datetime(2100, 1, 1), datetime(2100, 1, 1), 0, 51)),
+    'File.get_by_job_id': (
+        "SELECT * FROM user_files WHERE job_id = %s", ('job',)),
+}
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+
+    def statements(self):
+        """Split the file into statements; `--` comment lines are dropped"""
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith('--')]
+        return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Migrations on disk, ordered by version"""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(file_name)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, file_name)))
+        elif file_name.endswith('.sql'):
+            logger.warning(f"Ignoring migration {file_name}: expected NNNN_description.sql")
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate migration versions: {', '.join(duplicates)}")
+    return migrations
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at DATETIME NOT NULL,
+            execution_ms INT NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def applied_migrations():
+    """{version: row} for every migration recorded in schema_migrations"""
+    with db_connection(primary=True) as conn:
+        with conn.cursor() as cursor:
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+            return {row['version']: row for row in cursor.fetchall()}
+
+
+def status():
+    """(migration, applied row or None) for every migration on disk"""
+    applied = applied_migrations()
+    result = []
+    for migration in discover_migrations():
+        row = applied.get(migration.version)
+        if row and row['checksum'] != migration.checksum:
+            logger.warning(f"Migration {migration.version}_{migration.name} changed after it was applied")
+        result.append((migration, row))
+    return result
+
+
+def _record(cursor, migration, execution_ms):
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, applied_at, execution_ms) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        (migration.version, migration.name, migration.checksum, datetime.now(), execution_ms)
+    )
+
+
+def migrate(target=None):
+    """Apply pending migrations in version order (up to and including target). Returns the versions applied.
+
+    MySQL commits DDL implicitly, so a migration is recorded only after all of
+    its statements succeed; a failed one is retried from the top next run.
+    """
+    pending = [migration for migration, row in status() if row is None
+               and (target is None or migration.version <= target)]
+    applied = []
+    with db_connection(primary=True) as conn:
+        with conn.cursor() as cursor:
+            for migration in pending:
+                logger.info(f"Applying migration {migration.version}_{migration.name}")
+                started = time.perf_counter()
+                for statement in migration.statements():
+                    try:
+                        cursor.execute(statement)
+                    except Exception as e:
+                        code = e.args[0] if e.args else None
+                        if code not in ALREADY_APPLIED_ERRORS:
+                            logger.error(f"Migration {migration.version} failed: {str(e)}")
+                            raise
+                        logger.info(f"Skipping statement already in effect ({str(e)})")
+                _record(cursor, migration, int((time.perf_counter() - started) * 1000))
+                applied.append(migration.version)
+    return applied
+
+
+def baseline(version):
+    """Mark every migration up to version as applied without running it (for pre-existing schemas)"""
+    pending = [migration for migration, row in status() if row is None and migration.version <= version]
+    with db_connection(primary=True) as conn:
+        with conn.cursor() as cursor:
+            for migration in pending:
+                _record(cursor, migration, 0)
+    return [migration.version for migration in pending]
+
+
+def explain_hot_queries():
+    """EXPLAIN every registered hot query. Returns {name: {'plan': rows, 'warnings': [...]}}"""
+    report = {}
+    with db_connection(primary=True) as conn:
+        with conn.cursor() as cursor:
+            for name, (sql, params) in HOT_QUERIES.items():
+                cursor.execute(f"EXPLAIN {sql}", params)
+                plan = cursor.fetchall()
+                warnings = []
+                for row in plan:
+                    table = row.get('table')
+                    if row.get('type') == 'ALL':
+                        warnings.append(f"full table scan on {table}")
+                    if 'filesort' in (row.get('Extra') or ''):
+                        warnings.append(f"filesort on {table}")
+                report[name] = {'plan': plan, 'warnings': warnings}
+    return report
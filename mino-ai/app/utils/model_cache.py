@@ -0,0 +1,144 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from . import shared_cache
+
+def _normalize(key):
+    # Ids arrive as ints from rows and as strings from tokens and query args
+    try:
+        return int(key)
+    except (TypeError, ValueError):
+        return key
+
+
+class ModelCache:
+    """Process-wide read-through cache of model rows by primary key.
+
+    Rows (plain dicts) are cached rather than model instances, so every hit
+    builds a fresh instance and one request's changes never leak into
+    another's. Entries live for ttl seconds; beyond max_entries the least
+    recently used are dropped. Writers call invalidate() for the ids they
+    changed. Other processes writing the same table are only seen once the
+    TTL runs out, so keep it short.
+
+    With a shared cache (CACHE_BACKEND=redis) rows live there instead, under
+    model:<name>, so every worker and both services see one copy and one
+    service's invalidation reaches the others.
+    """
+
+    def __init__(self, name, ttl, max_entries, shared=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (row, expires at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """A copy of the cached row for key, or None"""
+        key = _normalize(key)
+        if self.shared is not None:
+            row = self.shared.get(key)
+            with self._lock:
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return dict(row)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def get_many(self, keys):
+        """{key: row copy} for those keys that are cached"""
+        found = {}
+        for key in keys:
+            row = self.get(key)
+            if row is not None:
+                found[key] = row
+        return found
+
+    def set(self, key, row):
+        key = _normalize(key)
+        if self.shared is not None:
+            self.shared.set(key, dict(row), self.ttl)
+            return
+        with self._lock:
+            self._entries[key] = (dict(row), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when key is None"""
+        if self.shared is not None:
+            if key is None:
+                self.shared.clear()
+            else:
+                self.shared.delete(_normalize(key))
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(_normalize(key), None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def cache_for(name):
+    """The cache for a model, or None when MODEL_CACHE_ENABLED is off (or outside an app context)"""
+    if not has_app_context() or not current_app.config.get('MODEL_CACHE_ENABLED'):
+        return None
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                shared = None
+                if current_app.config.get('CACHE_BACKEND') == 'redis':
+                    shared = shared_cache.get_cache(f"model:{name}")
+                cache = _caches[name] = ModelCache(
+                    name,
+                    ttl=current_app.config.get('MODEL_CACHE_TTL', 30),
+                    max_entries=current_app.config.get('MODEL_CACHE_MAX_ENTRIES', 10000),
+                    shared=shared
+                )
+    return cache
+
+
+def invalidate(name, key=None):
+    """Drop a model's cached row(s) after a write; a no-op when caching is off"""
+    # A worker that never read the model must still clear the shared copy
+    cache = _caches.get(name) or cache_for(name)
+    if cache is not None:
+        cache.invalidate(key)
+
+
+def stats():
+    return {name: cache.stats() for name, cache in list(_caches.items())}
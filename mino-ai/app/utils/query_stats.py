@@ -0,0 +1,167 @@
+import re
+import time
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+from pymysql.cursors import DictCursor
+from . import request_queries
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + '.slow')
+
+# Most recent samples kept per fingerprint for the rolling percentiles
+WINDOW_SIZE = 1024
+# Cap on distinct fingerprints so dynamically built SQL can't grow memory without bound
+MAX_FINGERPRINTS = 500
+OVERFLOW_FINGERPRINT = '<other>'
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%\(\w+\)s|%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_VALUES_RE = re.compile(r'\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*', re.I)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalize a SQL statement so every execution of the same shape shares one key.
+
+    Literals and placeholders become '?', IN/VALUES lists collapse to one entry
+    and whitespace is squashed. Cached because models pass constant templates.
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _COMMENT_RE.sub(' ', sql)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _VALUES_RE.sub(r'VALUES \1', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyWindow:
+    """Counters plus a bounded window of recent latencies (ms) for one statement shape"""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'rows', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, elapsed_ms, rows=0):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        self.samples.append(elapsed_ms)
+
+    def copy(self):
+        clone = LatencyWindow()
+        clone.count, clone.total_ms, clone.max_ms, clone.rows = self.count, self.total_ms, self.max_ms, self.rows
+        clone.samples = deque(self.samples, maxlen=WINDOW_SIZE)
+        return clone
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': round(_percentile(ordered, 0.50), 3),
+            'p95_ms': round(_percentile(ordered, 0.95), 3),
+            'p99_ms': round(_percentile(ordered, 0.99), 3),
+        }
+
+
+class QueryStats:
+    """In-process per-fingerprint latency statistics and slow-query logging"""
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_query_ms = 200.0
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._acquire = LatencyWindow()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('DB_QUERY_STATS_ENABLED', True)
+        self.slow_query_ms = float(app.config.get('DB_SLOW_QUERY_MS', self.slow_query_ms))
+
+    def record_query(self, sql, elapsed_ms, rows=0):
+        key = fingerprint(sql)
+        with self._lock:
+            window = self._queries.get(key)
+            if window is None:
+                if len(self._queries) >= MAX_FINGERPRINTS:
+                    key = OVERFLOW_FINGERPRINT
+                    window = self._queries.get(key)
+                if window is None:
+                    window = self._queries[key] = LatencyWindow()
+            window.add(elapsed_ms, rows)
+        request_queries.note_query(key, elapsed_ms)
+        if elapsed_ms >= self.slow_query_ms:
+            slow_query_logger.warning(f"Slow query ({elapsed_ms:.1f} ms, {rows} rows): {key}")
+        return key
+
+    def record_acquire(self, elapsed_ms):
+        """Record how long it took to get a connection (handshake or pool wait)"""
+        with self._lock:
+            self._acquire.add(elapsed_ms)
+        request_queries.note_connection(elapsed_ms)
+
+    def snapshot(self, limit=20):
+        """Statement shapes ordered by total time spent, plus connection-acquire latency"""
+        # Copy under the lock, sort outside it so the hot path isn't blocked
+        with self._lock:
+            windows = [(key, window.copy()) for key, window in self._queries.items()]
+            acquire = self._acquire.copy()
+        queries = [(key, window.summary()) for key, window in windows]
+        acquire = acquire.summary()
+        queries.sort(key=lambda item: item[1]['total_ms'], reverse=True)
+        return {
+            'slow_query_ms': self.slow_query_ms,
+            'connection_acquire': acquire,
+            'queries': [dict(summary, fingerprint=key) for key, summary in queries[:limit]],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._acquire = LatencyWindow()
+
+
+query_stats = QueryStats()
+
+
+class InstrumentedCursor(DictCursor):
+    """DictCursor that times every statement and feeds query_stats.
+
+    executemany() is covered too: PyMySQL implements it on top of execute().
+    """
+
+    def execute(self, query, args=None):
+        if not query_stats.enabled:
+            return super().execute(query, args)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            query_stats.record_query(query, elapsed_ms, max(self.rowcount, 0))
@@ -0,0 +1,103 @@
+import io
+import logging
+from PIL import Image, ImageOps
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (32, 64, 128, 256)
+DEFAULT_QUALITY = 80
+
+# Stored formats, best first; JPEG is the fallback for clients that don't accept WebP
+FORMATS = {
+    'webp': 'image/webp',
+    'jpg': 'image/jpeg',
+}
+
+# Decompression-bomb guard: uploads are at most 200KB, so anything claiming more
+# pixels than this is malformed or hostile
+MAX_SOURCE_PIXELS = 4096 * 4096
+
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image"""
+
+
+def thumbnail_sizes():
+    if has_app_context():
+        return tuple(current_app.config.get('PROFILE_THUMBNAIL_SIZES', DEFAULT_SIZES))
+    return DEFAULT_SIZES
+
+
+def variant_name(size, fmt):
+    return f"{size}.{fmt}"
+
+
+def pick_variant(requested_size, accept_webp):
+    """The stored variant to serve for a requested edge length: the smallest size
+    that covers it (the largest when none does), in WebP when the client accepts it"""
+    sizes = sorted(thumbnail_sizes())
+    size = next((size for size in sizes if size >= requested_size), sizes[-1])
+    return variant_name(size, 'webp' if accept_webp else 'jpg')
+
+
+def _decode(image_data):
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        if image.width * image.height > MAX_SOURCE_PIXELS:
+            raise InvalidImage(f"Image is too large ({image.width}x{image.height})")
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is much cheaper
+        # than decoding in full and downscaling afterwards
+        largest = max(thumbnail_sizes())
+        image.draft('RGB', (largest, largest))
+        image.load()
+    except InvalidImage:
+        raise
+    except Exception as e:
+        raise InvalidImage(f"Could not decode image: {str(e)}") from e
+    # Apply the camera's orientation tag before cropping
+    return ImageOps.exif_transpose(image)
+
+
+def _flatten(image):
+    """RGB copy of image; transparency is composited onto white, since JPEG has no alpha"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_thumbnails(image_data):
+    """Decode an upload once and return {variant: (content_type, bytes)} with a
+    square, center-cropped thumbnail per configured size in every FORMATS format.
+
+    Sizes are produced largest first, each downscaled from the previous one,
+    so only the first resize works on the full-resolution image.
+    """
+    quality = current_app.config.get('PROFILE_THUMBNAIL_QUALITY', DEFAULT_QUALITY) if has_app_context() else DEFAULT_QUALITY
+    source = _decode(image_data)
+    has_alpha = source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info)
+    source = source.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    current = source
+    for size in sorted(thumbnail_sizes(), reverse=True):
+        # Never upscale: small sources are cropped square at their own size
+        edge = min(size, current.width, current.height)
+        current = ImageOps.fit(current, (edge, edge), method=Image.LANCZOS)
+
+        webp = io.BytesIO()
+        current.save(webp, 'WEBP', quality=quality, method=4)
+        variants[variant_name(size, 'webp')] = (FORMATS['webp'], webp.getvalue())
+
+        jpeg = io.BytesIO()
+        _flatten(current).save(jpeg, 'JPEG', quality=quality, optimize=True, progressive=True)
+        variants[variant_name(size, 'jpg')] = (FORMATS['jpg'], jpeg.getvalue())
+
+    logger.debug(
+        f"Generated {len(variants)} thumbnails ({sum(len(data) for _, data in variants.values())} bytes) "
+        f"from a {source.width}x{source.height} image"
+    )
+    return variants
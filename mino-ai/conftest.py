@@ -0,0 +1,5 @@
+# Makes the app package importable from tests/ (pytest puts this directory on sys.path)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'redis: needs a Redis server at REDIS_TEST_URL; skipped when none is reachable')
@@ -0,0 +1,56 @@
+"""Apply versioned schema migrations from migrations/ and inspect hot-query plans.
+
+    python migrate.py status
+    python migrate.py up [--target 0003]
+    python migrate.py baseline 0001      # schema already exists, record without running
+    python migrate.py explain
+    python migrate.py backfill-images [--batch-size 100] [--pause 0.5]
+"""
+import sys
+import argparse
+from app import create_app
+from app.utils import migrations
+from app.services import profile_image_service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['status', 'up', 'baseline', 'explain', 'backfill-images'])
+    parser.add_argument('version', nargs='?', help='version for baseline')
+    parser.add_argument('--target', help='stop after this version (up)')
+    parser.add_argument('--batch-size', type=int, default=100, help='users per batch (backfill-images)')
+    parser.add_argument('--pause', type=float, default=0.5, help='seconds between batches (backfill-images)')
+    parser.add_argument('--limit', type=int, help='stop after moving this many images (backfill-images)')
+    parser.add_argument('--env', choices=['dev', 'prod'], default='prod')
+    args = parser.parse_args()
+    if args.command == 'baseline' and not args.version:
+        parser.error('baseline needs a version')
+
+    app = create_app(args.env)
+    with app.app_context():
+        if args.command == 'status':
+            for migration, row in migrations.status():
+                state = f"applied {row['applied_at']}" if row else 'pending'
+                print(f"{migration.version}  {migration.name:<45} {state}")
+        elif args.command == 'up':
+            applied = migrations.migrate(args.target)
+            print(f"Applied {len(applied)} migration(s): {', '.join(applied) or '-'}")
+        elif args.command == 'baseline':
+            recorded = migrations.baseline(args.version)
+            print(f"Recorded {len(recorded)} migration(s) as applied: {', '.join(recorded) or '-'}")
+        elif args.command == 'backfill-images':
+            moved = profile_image_service.backfill(args.batch_size, args.pause, args.limit)
+            print(f"Moved {moved} profile image(s) out of users.image")
+        else:
+            report = migrations.explain_hot_queries()
+            for name, result in report.items():
+                print(f"== {name}")
+                for row in result['plan']:
+                    print(f"   table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+                          f"rows={row.get('rows')} extra={row.get('Extra')}")
+                for warning in result['warnings']:
+                    print(f"   WARNING: {warning}")
+            if any(result['warnings'] for result in report.values()):
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+-- Initial schema, as previously created by User.create_tables() and File.create_tables()
+-- Existing databases can skip it with: python migrate.py baseline 0001
+
+CREATE TABLE IF NOT EXISTS users (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    credit_point INT DEFAULT 0,
+    phone VARCHAR(10),
+    firstname VARCHAR(255),
+    lastname VARCHAR(255),
+    image MEDIUMBLOB,
+    subscription VARCHAR(50) DEFAULT 'free',
+    tenant_id VARCHAR(255),
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    INDEX idx_username (username),
+    INDEX idx_email (email),
+    INDEX idx_tenant_id (tenant_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_files (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_path VARCHAR(512) NOT NULL,
+    file_size FLOAT NOT NULL,
+    job_id VARCHAR(64) NOT NULL,
+    processed BOOL DEFAULT FALSE,
+    upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    INDEX idx_user_id (user_id),
+    INDEX idx_job_id (job_id)
+);
@@ -0,0 +1,9 @@
+-- Migration script to add the composite index used by the paginated files listing
+-- GET /api/files/ pages with WHERE user_id = ? AND (upload_time, id) < (?, ?)
+-- ORDER BY upload_time DESC, id DESC, which this index serves without a filesort
+
+CREATE INDEX idx_user_upload_time ON user_files(user_id, upload_time, id);
+
+-- idx_user_id is now a prefix of idx_user_upload_time; it can be dropped once
+-- MySQL no longer needs it for the user_id foreign key
+-- DROP INDEX idx_user_id ON user_files;
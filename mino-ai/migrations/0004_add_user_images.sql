@@ -0,0 +1,15 @@
+-- Migration script to add the user_images table holding profile image thumbnails
+-- One row per (user, variant), e.g. variant '64.webp'; version is the MD5 of the
+-- users.image they were generated from. Users who uploaded before this migration
+-- get their thumbnails generated on first request.
+
+CREATE TABLE IF NOT EXISTS user_images (
+    user_id INT NOT NULL,
+    variant VARCHAR(16) NOT NULL,
+    version CHAR(32) NOT NULL,
+    content_type VARCHAR(32) NOT NULL,
+    data MEDIUMBLOB NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, variant),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,15 @@
+-- Migration script to move profile images out of the users table
+-- New uploads go to S3 (or user_images, PROFILE_IMAGE_STORAGE=db) and users keeps
+-- only where the image lives (image_key) and its MD5 (image_version).
+-- Existing images are moved in the background, in batches, with:
+--     python migrate.py backfill-images [--batch-size 100] [--pause 0.5]
+-- Readers handle both layouts meanwhile. Once the backfill reports nothing left,
+-- and both services are deployed with image_key support, a later migration can
+-- drop the column:
+-- ALTER TABLE users DROP COLUMN image;
+
+ALTER TABLE users
+ADD COLUMN image_key VARCHAR(512) NULL AFTER image;
+
+ALTER TABLE users
+ADD COLUMN image_version CHAR(32) NULL AFTER image_key;
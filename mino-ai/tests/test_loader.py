@@ -0,0 +1,142 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import pytest
+from flask import Flask, g
+import app.models.file as file_model
+import app.api.files as files_api
+from app.utils.loader import DataLoader
+
+
+class FakeCursor:
+    def __init__(self, rows, statements):
+        self.rows = rows
+        self.statements = statements
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        self.params = params
+
+    def fetchone(self):
+        return self.rows.get(self.params[0])
+
+    def fetchall(self):
+        return [self.rows[file_id] for file_id in self.params if file_id in self.rows]
+
+
+@pytest.fixture
+def user_files(monkeypatch):
+    """Three user_files rows behind a fake connection; yields the executed statements"""
+    rows = {
+        file_id: {
+            'id': file_id, 'user_id': 7, 'file_name': f"{file_id}.mp3", 'file_path': f"7/{file_id}.mp3",
+            'file_size': 1.0, 'job_id': f"job-{file_id}", 'upload_time': datetime(2024, 1, 1), 'processed': 1
+        }
+        for file_id in (1, 2, 3)
+    }
+    statements = []
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor(rows, statements)
+
+    @contextmanager
+    def fake_db_connection(*args, **kwargs):
+        yield FakeConnection()
+
+    monkeypatch.setattr(file_model, 'db_connection', fake_db_connection)
+    return statements
+
+
+@pytest.fixture
+def flask_app():
+    app = Flask(__name__)
+    app.config['MODEL_CACHE_ENABLED'] = False
+    return app
+
+
+def test_data_loader_coalesces_wanted_keys():
+    calls = []
+
+    def batch(keys):
+        calls.append(list(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = DataLoader(batch)
+    assert loader.load_many([1, 2, 3]) == [10, 20, None]
+    assert loader.load(2) == 20
+    assert calls == [[1, 2, 3]]
+
+
+def test_get_by_id_without_a_request_issues_a_query_per_id(user_files):
+    for file_id in (1, 2, 3):
+        file_model.File.get_by_id(file_id)
+    assert len(user_files) == 3
+
+
+def test_get_many_issues_one_query(user_files, flask_app):
+    with flask_app.app_context():
+        files = file_model.File.get_many([1, 2, 3, 4])
+    assert sorted(files) == [1, 2, 3]
+    assert len(user_files) == 1
+
+
+def test_get_by_id_after_load_many_reuses_the_batch(user_files, flask_app):
+    with flask_app.test_request_context():
+        file_model.File.loader().load_many([1, 2, 3])
+        for file_id in (1, 2, 3):
+            assert file_model.File.get_by_id(file_id).id == file_id
+    assert len(user_files) == 1
+
+
+def test_summaries_endpoint_loads_all_files_in_one_query(user_files, flask_app, monkeypatch):
+    monkeypatch.setattr(files_api, 'get_file_summary', lambda file_path: {'summary': file_path})
+    monkeypatch.setattr(files_api, 'summary_retry_after', lambda file_path: None)
+    view = files_api.get_file_summaries.__wrapped__
+
+    with flask_app.test_request_context('/summaries?file_ids=1,2,3,9'):
+        response, status = view(7)
+
+    assert status == 200
+    summaries = response.get_json()['summaries']
+    assert summaries['1'] == {'summary': '7/1.mp3'}
+    assert summaries['9'] == {'error': 'File not found'}
+    assert len(user_files) == 1
+
+
+def test_summaries_endpoint_returns_partial_results_when_the_budget_runs_low(user_files, flask_app, monkeypatch):
+    fetched = []
+
+    def slow_summary(file_path):
+        fetched.append(file_path)
+        # The first fetch uses up the budget
+        g._deadline = time.monotonic() + 0.5
+        return {'summary': file_path}
+
+    monkeypatch.setattr(files_api, 'get_file_summary', slow_summary)
+    view = files_api.get_file_summaries.__wrapped__
+
+    with flask_app.test_request_context('/summaries?file_ids=1,2,3'):
+        g._deadline = time.monotonic() + 30
+        response, status = view(7)
+
+    assert status == 200
+    summaries = response.get_json()['summaries']
+    assert summaries['1'] == {'summary': '7/1.mp3'}
+    assert summaries['2'] == summaries['3'] == {'status': 'processing', 'retry_after': 1}
+    assert fetched == ['7/1.mp3']
+
+
+def test_summaries_endpoint_caps_the_batch(flask_app):
+    view = files_api.get_file_summaries.__wrapped__
+    file_ids = ','.join(str(file_id) for file_id in range(1, files_api.SUMMARY_BATCH_MAX + 2))
+    with flask_app.test_request_context(f"/summaries?file_ids={file_ids}"):
+        _, status = view(7)
+    assert status == 400
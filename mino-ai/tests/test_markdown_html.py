@@ -0,0 +1,66 @@
+from html.parser import HTMLParser
+import pytest
+from app.utils import markdown_html
+
+
+def attribute_names(html):
+    names = set()
+
+    class Collector(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            names.update(name for name, _ in attrs)
+
+    Collector().feed(html)
+    return names
+
+
+def link_html(target):
+    html, _ = markdown_html.render(f"[x]({target})")
+    return html
+
+
+@pytest.mark.parametrize('target', [
+    'javascript:alert(1)',
+    'JaVaScRiPt:alert(1)',
+    'java&#115;cript:alert(document.cookie)',
+    '&#x6A;avascript:alert(1)',
+    'java&Tab;script:alert(1)',
+    '<java\tscript:alert(1)>',
+    '<java\nscript:alert(1)>',
+    '<\x01javascript:alert(1)>',
+])
+def test_unsafe_link_schemes_are_dropped(target):
+    assert 'href' not in link_html(target)
+
+
+def test_safe_links_are_kept():
+    html = link_html('https://example.com/a?b=1')
+    assert 'href="https://example.com/a?b=1"' in html
+    assert 'rel="nofollow noopener"' in html
+
+
+def test_data_image_is_dropped():
+    html, _ = markdown_html.render("![i](data:image/svg+xml;base64,PHN2Zz4=)")
+    assert 'src' not in html
+
+
+def test_raw_html_is_escaped():
+    html, _ = markdown_html.render("<script>alert(1)</script>")
+    assert '<script>' not in html
+
+
+@pytest.mark.parametrize('text, attribute', [
+    ('[x](https://a.com){: onclick="alert(1)" }', 'onclick'),
+    ('![i](https://a/b.png){: onerror="alert(1)" }', 'onerror'),
+    ('para\n{: onmouseover="alert(1)" style="position:fixed;inset:0" }', 'onmouseover'),
+    ('para\n{: onmouseover="alert(1)" style="position:fixed;inset:0" }', 'style'),
+])
+def test_author_attributes_are_dropped(text, attribute):
+    html, _ = markdown_html.render(text)
+    assert attribute not in attribute_names(html)
+
+
+def test_table_alignment_is_kept():
+    html, _ = markdown_html.render("|a|b|\n|:-|-:|\n|1|2|")
+    assert 'align="left"' in html
+    assert 'style' not in attribute_names(html)
@@ -0,0 +1,144 @@
+"""SharedCache against a real Redis.
+
+Runs against REDIS_TEST_URL (default redis://localhost:6379/15) and is
+skipped when nothing answers there, e.g.
+
+    redis-server --port 6379 --save '' &
+    pytest -m redis
+"""
+import os
+import uuid
+import threading
+from decimal import Decimal
+from datetime import datetime, date
+import pytest
+import redis
+from app.utils import shared_cache
+from app.utils.shared_cache import SharedCache, LocalTier, RedisTier
+
+pytestmark = pytest.mark.redis
+
+
+@pytest.fixture
+def redis_client():
+    url = os.environ.get('REDIS_TEST_URL', 'redis://localhost:6379/15')
+    client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=0.2)
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip(f"No Redis server at {url}")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def prefix(redis_client):
+    """A key prefix of our own, removed afterwards"""
+    prefix = f"test-{uuid.uuid4().hex}"
+    yield prefix
+    keys = list(redis_client.scan_iter(match=f"{prefix}:*"))
+    if keys:
+        redis_client.delete(*keys)
+
+
+def make_cache(redis_client, prefix, namespace='rows', lock_ttl=2):
+    """A cache as one worker sees it: its own L1 over the shared Redis"""
+    return SharedCache(
+        namespace, prefix=prefix, ttl=60, local_ttl=5,
+        local=LocalTier(100), remote=RedisTier(redis_client), lock_ttl=lock_ttl
+    )
+
+
+def test_get_or_set_loads_once_across_workers(redis_client, prefix):
+    first, second = make_cache(redis_client, prefix), make_cache(redis_client, prefix)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'id': 1}
+
+    assert first.get_or_set(1, loader) == {'id': 1}
+    assert second.get_or_set(1, loader) == {'id': 1}
+    assert len(calls) == 1
+    assert second.remote_hits == 1
+    assert redis_client.pttl(first.key(1)) > 0
+
+
+def test_waiters_take_the_lock_holders_value(redis_client, prefix):
+    holder, waiter = make_cache(redis_client, prefix), make_cache(redis_client, prefix)
+    lock_key = f"{holder.key(1)}:lock"
+    token = holder.remote.acquire_lock(lock_key, 2)
+    assert token is not None
+    assert waiter.remote.acquire_lock(lock_key, 2) is None
+
+    def finish_load():
+        holder.set(1, {'id': 1, 'by': 'holder'})
+        holder.remote.release_lock(lock_key, token)
+
+    timer = threading.Timer(0.1, finish_load)
+    timer.start()
+    try:
+        value = waiter.get_or_set(1, lambda: pytest.fail("waiter should not load"))
+    finally:
+        timer.join()
+    assert value == {'id': 1, 'by': 'holder'}
+    assert waiter.loads == 0
+    assert not redis_client.exists(lock_key)
+
+
+def test_lock_is_only_released_by_its_holder(redis_client, prefix):
+    tier = RedisTier(redis_client)
+    lock_key = f"{prefix}:rows:1:lock"
+    token = tier.acquire_lock(lock_key, 2)
+    tier.release_lock(lock_key, 'someone-else')
+    assert redis_client.get(lock_key) == token.encode('ascii')
+    tier.release_lock(lock_key, token)
+    assert not redis_client.exists(lock_key)
+
+
+def test_waiter_loads_itself_when_the_holder_never_finishes(redis_client, prefix):
+    holder, waiter = make_cache(redis_client, prefix), make_cache(redis_client, prefix, lock_ttl=0.3)
+    holder.remote.acquire_lock(f"{holder.key(1)}:lock", 2)
+    assert waiter.get_or_set(1, lambda: {'id': 1}) == {'id': 1}
+    assert waiter.loads == 1
+
+
+def test_delete_and_clear(redis_client, prefix):
+    rows, other = make_cache(redis_client, prefix), make_cache(redis_client, prefix, namespace='other')
+    for key in range(3):
+        rows.set(key, {'id': key})
+    other.set(0, {'id': 0})
+
+    rows.delete(0)
+    assert not redis_client.exists(rows.key(0))
+    assert rows.get(0) is None
+
+    rows.clear()
+    assert list(redis_client.scan_iter(match=f"{prefix}:rows:*")) == []
+    assert make_cache(redis_client, prefix).get(1) is None
+    assert redis_client.exists(other.key(0))
+
+
+@pytest.mark.parametrize('padding', [0, 4096], ids=['plain', 'compressed'])
+def test_rows_round_trip_through_msgpack(redis_client, prefix, padding):
+    pytest.importorskip('msgpack')
+    row = {
+        'id': 7,
+        'amount': Decimal('1999.50'),
+        'created_at': datetime(2024, 3, 1, 12, 30, 15, 250000),
+        'valid_until': date(2025, 1, 31),
+        'note': 'x' * padding,
+        'tags': ['a', 'b'],
+        'deleted_at': None,
+    }
+    make_cache(redis_client, prefix).set(7, row)
+
+    raw = redis_client.get(f"{prefix}:rows:7")
+    assert raw[0] & ~shared_cache.COMPRESSED == shared_cache.FORMAT_MSGPACK[0]
+    assert bool(raw[0] & shared_cache.COMPRESSED) == bool(padding)
+
+    value = make_cache(redis_client, prefix).get(7)
+    assert value == row
+    assert type(value['amount']) is Decimal
+    assert type(value['created_at']) is datetime
+    assert type(value['valid_until']) is date
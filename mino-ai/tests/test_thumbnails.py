@@ -0,0 +1,26 @@
+import pytest
+from flask import Flask
+from app.utils import thumbnails
+
+
+@pytest.fixture
+def unsorted_sizes():
+    app = Flask(__name__)
+    app.config['PROFILE_THUMBNAIL_SIZES'] = [128, 32, 256, 64]
+    with app.app_context():
+        yield
+
+
+@pytest.mark.parametrize('requested, variant', [
+    (1, '32.webp'),
+    (32, '32.webp'),
+    (33, '64.webp'),
+    (100, '128.webp'),
+    (1000, '256.webp'),
+])
+def test_pick_variant_with_unsorted_sizes(unsorted_sizes, requested, variant):
+    assert thumbnails.pick_variant(requested, accept_webp=True) == variant
+
+
+def test_pick_variant_falls_back_to_jpeg(unsorted_sizes):
+    assert thumbnails.pick_variant(50, accept_webp=False) == '64.jpg'
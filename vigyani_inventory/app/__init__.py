@@ -5,6 +5,8 @@ from flask_cors import CORS
 from .config.config import config_by_name
 from .api import register_routes
 from .utils.env import load_env
+from .utils.query_stats import query_stats
+from .utils import request_queries
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,8 @@ def create_app(config_name='dev'):
     
     # Initialize configuration with environment variables
     config.init_app(app)
+    query_stats.init_app(app)
+    request_queries.init_app(app)
     
     # Verify configuration after initialization
     logger.info("Verifying configuration after initialization:")
@@ -2,6 +2,11 @@ from flask import Blueprint, jsonify
 from .products import products_bp
 # from .health import health_bp
 from .razorpay import razorpay_bp
+from .logs import logs_bp
+from .export import export_bp
+from ..utils.db import db_manager
+from ..utils.query_stats import query_stats
+from ..utils import model_cache, shared_cache
 from datetime import datetime
 
 def register_routes(app):
@@ -14,11 +19,24 @@ def register_routes(app):
             "status": "healthy",
             "timestamp": datetime.now().isoformat()
         }), 200
+
+    # Connection pools and per-statement latency percentiles
+    @app.route('/health/db')
+    def db_health_check():
+        return jsonify({
+            "pool": db_manager.pool_stats(),
+            "queries": query_stats.snapshot(),
+            "model_cache": model_cache.stats(),
+            "shared_cache": shared_cache.stats(),
+            "timestamp": datetime.now().isoformat()
+        }), 200
     
     # Register API routes with their prefixes
     # These paths should match your ALB path-based routing rules
     app.register_blueprint(products_bp, url_prefix='/api/products')
     app.register_blueprint(razorpay_bp, url_prefix='/api/payment')
+    app.register_blueprint(logs_bp, url_prefix='/api/payment')
+    app.register_blueprint(export_bp, url_prefix='/api/payment')
     
     # Add a catch-all route for undefined paths
     @app.route('/<path:path>')
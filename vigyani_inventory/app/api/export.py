@@ -0,0 +1,32 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from ..services.export_service import export
+from ..utils.auth import admin_required
+from ..utils.pagination import parse_date_range
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+export_bp = Blueprint('export', __name__)
+
+@export_bp.route('/export/<dataset>', methods=['GET'])
+@admin_required
+def export_dataset(user_id, dataset):
+    """Stream payments or payment_logs as CSV/NDJSON (?format=, ?from=, ?to=). Admins only: the export covers every user"""
+    fmt = request.args.get('format', 'csv')
+    try:
+        start, end = parse_date_range(request.args.get('from'), request.args.get('to'))
+        chunks, mimetype = export(dataset, fmt, start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    logger.info(f"User {user_id} exporting {dataset} as {fmt} (from={start}, to={end})")
+    file_name = f"{dataset}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    # stream_with_context keeps the app context (config, db_manager) alive while the body streams
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{file_name}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -1,42 +1,76 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from ..models.logs import Logs
+from ..utils.auth import admin_required
+from ..utils.request_queries import query_budget
+from ..utils.pagination import parse_limit, encode_cursor, decode_cursor, stream_json_page, parse_date_range
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 logs_bp = Blueprint('logs', __name__)
 
+def _serialize_log(log):
+    return {
+        'id': log.id,
+        'txnid': log.txnid,
+        'status': log.status,
+        'amount': log.amount,
+        'created_at': log.created_at.isoformat(),
+    }
+
 @logs_bp.route('/logs', methods=['GET'])
-def get_all_logs():
+@query_budget(1)
+@admin_required
+def get_all_logs(user_id):
+    """Page through logs (?limit=, ?cursor=) filtered by ?status= and ?from=/?to="""
     try:
-        status = request.args.get('status')
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            start, end = parse_date_range(request.args.get('from'), request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        if not status:
-            logs = Logs.get_all_logs()
-        elif status :
-            logs = Logs.get_log_by_status(status)
-        else:
-            return jsonify({'message': 'Invalid request'}), 400
+        logs, next_key = Logs.get_page(limit, after, status=request.args.get('status'), start=start, end=end)
 
-        if not logs:
+        if not logs and not cursor:
             return jsonify({'message': 'Log not found'}), 404
-        
-        log_list = [{
-            'id': log.id,
-            'txnid': log.txnid,
-            'status': log.status,
-            'amount': log.amount,
-            'created_at': log.created_at.isoformat(),
-        } for log in logs]
-            
-        return jsonify({'logs': log_list}), 200
+
+        next_cursor = encode_cursor(*next_key) if next_key else None
+        return Response(
+            stream_json_page('logs', logs, _serialize_log, next_cursor),
+            mimetype='application/json'
+        ), 200
 
     except Exception as e:
         logger.error(f"Error fetching logs: {str(e)}")
         return jsonify({'error': 'Failed to fetch log'}), 500
+
+@logs_bp.route('/logs/summary', methods=['GET'])
+@query_budget(1)
+@admin_required
+def get_logs_summary(user_id):
+    """Count and amount per status, optionally within ?from=/?to="""
+    try:
+        try:
+            start, end = parse_date_range(request.args.get('from'), request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        summary = Logs.get_status_summary(start=start, end=end)
+        return jsonify({
+            'summary': summary,
+            'total': sum(row['count'] for row in summary)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching logs summary: {str(e)}")
+        return jsonify({'error': 'Failed to fetch logs summary'}), 500
     
 @logs_bp.route('/logs/id', methods=['GET'])
-def get_log_by_txnid():
+@admin_required
+def get_log_by_txnid(user_id):
     try:
         txnid = request.args.get('txn_id')
         log = Logs.get_log_by_txnid(txnid)
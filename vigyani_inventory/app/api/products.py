@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify
-from ..models.products import Products
+from flask import Blueprint, Response, request, jsonify, current_app
+from ..services.catalog_service import catalog_cache, invalidate_catalog
+from ..utils.auth import admin_required
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,38 +8,29 @@ products_bp = Blueprint('products', __name__)
 
 @products_bp.route('/list', methods=['GET'])
 def get_product_list():
-    """Get all products"""
+    """Get all products (served from the in-process catalog cache)"""
     try:
-        products = Products.get_product_list()
-        if not products:
+        catalog = catalog_cache.get()
+        if catalog is None:
             return jsonify({'message': 'No products found'}), 404
 
-        product_list = []
-        for product in products:
-            # Build description list, filtering out None values
-            description_list = []
-            if product.first:
-                description_list.append(product.first)
-            if product.second:
-                description_list.append(product.second)
-            if product.third:
-                description_list.append(product.third)
-            if product.fourth:
-                description_list.append(product.fourth)
-            
-            product_list.append({
-                'id': product.id,
-                'type': product.type,
-                'month_amount': int(float(product.amount)),
-                'month_credit': int(float(product.credit)),
-                'year_credit': int(float(product.credit)) * 12,
-                'year_amount': int(float(product.amount)) * 12 * 0.85,  # Assuming 15% discount for yearly subscription
-                'description': description_list,
-                'period': product.period
-            })
-
-        return jsonify({'products': product_list}), 200
+        if request.if_none_match.contains(catalog.etag):
+            response = Response(status=304)
+        else:
+            response = Response(catalog.body, mimetype='application/json')
+        response.set_etag(catalog.etag)
+        max_age = current_app.config.get('CATALOG_CACHE_MAX_AGE', 60)
+        response.headers['Cache-Control'] = f"public, max-age={max_age}, stale-while-revalidate={max_age}"
+        return response
 
     except Exception as e:
         logger.error(f"Error fetching product list: {str(e)}")
-        return jsonify({'error': 'Failed to fetch products'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch products'}), 500
+
+@products_bp.route('/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_product_cache(current_user_id):
+    """Rebuild the catalog on the next request (after editing the products table). Admins only"""
+    logger.info(f"Product catalog cache invalidated by user {current_user_id}")
+    invalidate_catalog()
+    return jsonify({'message': 'Product catalog cache invalidated'}), 200
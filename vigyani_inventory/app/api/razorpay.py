@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
 from razorpay import Client
+from razorpay.errors import SignatureVerificationError
 import json
 import logging
 from ..utils.auth import token_required
-from ..utils.db import db_transaction
+from ..utils.db import db_connection, unit_of_work, after_commit
 from ..services.email_service import handle_email_notification
 from ..models.users import User
 from ..models.payment import Payments
@@ -41,8 +42,8 @@ def create_order(user_id):
         if not all([amount, receipt]):
             return jsonify({'error': 'Amount and receipt are required'}), 400
 
-        # Validate user
-        user = User.get_by_id(user_id)
+        # Validate user; only the subscription is touched here
+        user = User.get_by_id(user_id, only=('subscription',))
         user.subscription = notes.get('tierName')
         user.save()
         logger.info(f"User subscription updated: {user.subscription}")
@@ -97,12 +98,13 @@ def create_order(user_id):
 
 def handle_payment(user, payment, success=False):
     """Handle payment success or failure"""
+    # Emails go out only once the payment state they describe is committed
     if success:
         logger.info(f"Payment successful for user: {user.email}")
-        handle_email_notification(user.email, user.firstname, payment.amount, success=True)
+        after_commit(handle_email_notification, user.email, user.firstname, payment.amount, success=True)
     else:
         logger.error(f"Payment failed for user: {user.email}")
-        handle_email_notification(user.email, user.firstname, payment.amount, success=False)
+        after_commit(handle_email_notification, user.email, user.firstname, payment.amount, success=False)
     
     
 
@@ -112,222 +114,225 @@ def handle_payment(user, payment, success=False):
     payment.save()
     logger.debug(f"Payment status updated to {payment.status} for user: {user.email}")
 
-@razorpay_bp.route('/verify-payment', methods=['POST'])
-@token_required
-def verify_payment(user_id):
-    """Verify Razorpay payment and update user credits"""
-    # Fetch existing user's details
-    user = User.get_by_id(user_id)
-    payment = Payments.get_latest_by_user_id(user_id)
-    
-    try:
-        data = request.get_json()
-        logger.debug("=== Starting Payment Verification ===")
-        logger.debug(f"Received request data: {json.dumps(data, indent=2)}")
-
-        # Extract payment details
-        razorpay_order_id = data.get('razorpay_order_id')
-        razorpay_payment_id = data.get('razorpay_payment_id')
-        razorpay_signature = data.get('razorpay_signature')
-        expected_amount = data.get('amount')  # Amount from frontend for double verification
-        
-        if not razorpay_payment_id:
-            logger.warning("Payment ID missing in request - payment may not have completed (possibly due to Razorpay gateway error)")
+class PaymentVerificationError(Exception):
+    """Verification failed; raised inside the unit of work so none of its writes commit.
+
+    log_status and payment_status say what the failure is recorded as afterwards
+    (payment_status None leaves the payment row alone).
+    """
 
-            # Try to get payment by order ID
-            if not payment and razorpay_order_id:
-                payment = Payments.get_by_provider_order_id(razorpay_order_id)
+    def __init__(self, message, status_code=400, log_status=Payments.STATUS_FAILED, payment_status=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.log_status = log_status
+        self.payment_status = payment_status
 
-            # Log the failure in Logs table
-            payment_log = Logs(
-                txnid=razorpay_order_id or f"FAIL_{user_id}_{int(datetime.now().timestamp())}",
-                status=Payments.STATUS_FAILED,
+
+def _record_failure(user_id, txnid, expected_amount, log_status, payment_status=None):
+    """Record a failed verification in its own transaction"""
+    try:
+        with unit_of_work():
+            user, payment = User.get_with_latest_payment(user_id)
+            if txnid:
+                payment = Payments.get_by_provider_order_id(txnid) or payment
+
+            Logs(
+                txnid=txnid or f"FAIL_{user_id}_{int(datetime.now().timestamp())}",
+                status=log_status,
                 amount=payment.amount if payment else float(expected_amount or 0) / 100,
                 created_at=datetime.now()
-            )
-            payment_log.save()
+            ).save()
 
-            if payment:
+            if not payment:
+                logger.warning(f"No payment object found to mark as {payment_status}")
+            elif payment_status == Payments.STATUS_FAILED:
                 handle_payment(user, payment, success=False)
-            else:
-                logger.warning("No payment object found to mark as failed")
+            elif payment_status:
+                payment.status = payment_status
+                payment.updated_at = datetime.now()
+                payment.save()
+    except Exception as e:
+        logger.error(f"Failed to record payment verification failure for user {user_id}: {str(e)}")
 
-            return jsonify({
-                'error': 'Payment verification failed',
-                'message': 'Payment ID is missing. This usually happens when the payment gateway encounters an error (e.g., 502 Bad Gateway) and the payment does not complete.',
-                'status': 'failed'
-            }), 400
 
+def _fetch_verified_payment(razorpay_order_id, razorpay_payment_id, razorpay_signature, expected_amount):
+    """Check the signature and fetch the payment from Razorpay. Runs before any
+    transaction is opened, so no row lock is held across the network calls."""
+    razorpay_client = get_razorpay_client()
+    logger.debug("Razorpay client initialized")
 
+    try:
+        razorpay_client.utility.verify_payment_signature({
+            'razorpay_order_id': razorpay_order_id,
+            'razorpay_payment_id': razorpay_payment_id,
+            'razorpay_signature': razorpay_signature
+        })
+    except SignatureVerificationError:
+        logger.error(f"Invalid payment signature for order {razorpay_order_id}")
+        raise PaymentVerificationError('Invalid payment signature')
+
+    logger.debug(f"Fetching payment details for ID: {razorpay_payment_id}")
+    payment_details = razorpay_client.payment.fetch(razorpay_payment_id)
+    logger.debug(f"Razorpay payment details: {json.dumps(payment_details, indent=2)}")
+
+    if not payment_details:
+        logger.error("No payment details returned from Razorpay")
+        raise PaymentVerificationError('Payment details not found', status_code=404)
+
+    razorpay_amount = int(payment_details.get('amount', 0))
+    razorpay_status = payment_details.get('status')
+    logger.debug(f"""
+    Payment Details from Razorpay:
+    - Amount: {razorpay_amount}
+    - Status: {razorpay_status}
+    - Order ID: {payment_details.get('order_id')}
+    - Currency: {payment_details.get('currency', 'INR')}
+    """)
+
+    # Verify payment status
+    if razorpay_status not in ['captured', 'authorized']:
+        logger.error(f"Payment not completed. Status: {razorpay_status}")
+        raise PaymentVerificationError(f'Payment not completed. Status: {razorpay_status}')
+
+    # Verify amount if provided
+    if expected_amount and int(expected_amount) != razorpay_amount:
+        logger.error(f"Amount mismatch. Expected: {expected_amount}, Received: {razorpay_amount}")
+        raise PaymentVerificationError('Amount mismatch')
+
+    return payment_details
 
-        # Initialize Razorpay client
-        razorpay_client = get_razorpay_client()
-        logger.debug("Razorpay client initialized")
-
-        try:
-            # Create initial payment log entry with processing status
-            payment_log = Logs.get_log_by_txnid(razorpay_order_id)
-
-            if payment_log:
-                logger.debug("Existing log found. Updating status to pending.")
-                payment_log.status = Payments.STATUS_PENDING
-                payment_log.amount = float(expected_amount)/100 if expected_amount else 0
-            else:
-                logger.debug("Creating new log for transaction.")
-                payment_log = Logs(
-                    txnid=razorpay_order_id or f"FAIL_{user_id}_{int(datetime.now().timestamp())}",
-                    status=Payments.STATUS_PENDING,
-                    amount=float(expected_amount)/100 if expected_amount else 0,
-                    created_at=datetime.now()
-                )
-            payment_log.save()
-
-            # Fetch payment details from Razorpay
-            logger.debug(f"Fetching payment details for ID: {razorpay_payment_id}")
-            payment_details = razorpay_client.payment.fetch(razorpay_payment_id)
-            logger.debug(f"Razorpay payment details: {json.dumps(payment_details, indent=2)}")
-            
-            if not payment_details:
-                payment_log.status = Payments.STATUS_FAILED
-                payment_log.save()
-                logger.error("No payment details returned from Razorpay")
-                return jsonify({'error': 'Payment details not found'}), 404
-
-            # Extract payment information
-            razorpay_amount = int(payment_details.get('amount', 0))
-            razorpay_status = payment_details.get('status')
-            razorpay_order_id = payment_details.get('order_id')
-            razorpay_currency = payment_details.get('currency', 'INR')
-
-            logger.debug(f"""
-            Payment Details from Razorpay:
-            - Amount: {razorpay_amount}
-            - Status: {razorpay_status}
-            - Order ID: {razorpay_order_id}
-            - Currency: {razorpay_currency}
-            - Signature: {razorpay_signature}
-            """)
-
-            # Verify payment status
-            if razorpay_status not in ['captured', 'authorized']:
-                payment_log.status = Payments.STATUS_FAILED
-                # payment_log.payment_data = json.dumps({
-                #     **json.loads(payment_log.payment_data),
-                #     "razorpay_status": razorpay_status,
-                #     "error": f"Payment not completed. Status: {razorpay_status}"
-                # })
-                payment_log.save()
-                logger.error(f"Payment not completed. Status: {razorpay_status}")
-                return jsonify({'error': f'Payment not completed. Status: {razorpay_status}'}), 400
-
-            # Verify amount if provided
-            if expected_amount and int(expected_amount) != razorpay_amount:
-                payment_log.status = Payments.STATUS_FAILED
-                # payment_log.payment_data = json.dumps({
-                #     **json.loads(payment_log.payment_data),
-                #     "error": f"Amount mismatch. Expected: {expected_amount}, Received: {razorpay_amount}"
-                # })
-                payment_log.save()
-                logger.error(f"Amount mismatch. Expected: {expected_amount}, Received: {razorpay_amount}")
-                return jsonify({'error': 'Amount mismatch'}), 400
-
-            # Find payment record using payment ID first
-            payment = Payments.get_by_provider_payment_id(razorpay_payment_id)
-            
-            # If not found and we have order ID, try that
-            if not payment and razorpay_order_id:
-                payment = Payments.get_by_provider_order_id(razorpay_order_id)
-                logger.debug(f"Looking up payment by Razorpay order ID: {razorpay_order_id}")
-
-            credits = data.get('credits')
-            logger.debug(f"Calculated credits: {credits} for amount: {razorpay_amount}")
-
-            subscription = data.get('subscription')
-            user.subscription = subscription
-            user.save()
-            logger.info(f"User subscription updated: {user.subscription}")
-
-            # Update payment status and details
-            logger.debug("Updating payment record with verification details")
-            payment.provider_payment_id = razorpay_payment_id
-            payment.provider_signature = razorpay_signature
-            payment.notes = json.dumps({
-                **json.loads(payment.notes or '{}'),
-                'verification_data': payment_details,
-                'credits': credits
-            })
-            handle_payment(user, payment, success=True)
-            logger.debug("Payment record updated successfully")
-
-            # Update payment log with success status
-            payment_log.status = payment.status
-            payment_log.amount = payment.amount
-            # payment_log.payment_data = json.dumps({
-            #     "order_id": payment.order_id,
-            #     "payment_id": payment.provider_payment_id,
-            #     "signature": payment.provider_signature,
-            #     "notes": json.loads(payment.notes or '{}'),
-            #     "currency": payment.currency,
-            #     "status": "completed"
-            # })
-            payment_log.save()
-            logger.debug("Payment Logs updated with success status")
-
-            # Update user credits
-            logger.debug(f"Updating credits for user ID: {user_id}")
-            previous_credits = user.credit_point
-            user.update_credits(credits)
-            logger.debug(f"Credits updated: {previous_credits} -> {user.credit_point}")
-
-            logger.info(f"Payment verification successful. Credits added: {credits}")
-            logger.debug("=== Payment Verification Completed ===")
-            
-            return jsonify({
-                'status': 'success',
-                'credits_added': credits,
-                'total_credits': user.credit_point
-            }), 200
-
-        except Exception as e:
-            # Update payment log with error status
-            if payment_log:
-                payment_log.status = "incomplete"
-                # payment_log.payment_data = json.dumps({
-                #     **json.loads(payment_log.payment_data),
-                #     "error": str(e)
-                # })
-                payment_log.save()
-            handle_payment(user, payment, success=False)
-            logger.error(f"Error processing payment details: {str(e)}")
-            logger.debug("Full error details:", exc_info=True)
-            return jsonify({'error': 'Failed to process payment details'}), 400
 
-    except Exception as e:
-        # Update payment log with error status if it exists
-        if 'payment_log' in locals():
-            payment_log.status = "incomplete"
-            # payment_log.payment_data = json.dumps({
-            #     **json.loads(payment_log.payment_data),
-            #     "error": str(e)
-            # })
-            payment_log.save()
-        if payment:
-            payment.status = Payments.STATUS_PENDING
-            payment.save()
-        else:
-            logger.warning("No payment object found to mark as pending after exception")
+@razorpay_bp.route('/verify-payment', methods=['POST'])
+@token_required
+def verify_payment(user_id):
+    """Verify Razorpay payment and update user credits"""
+    data = request.get_json() or {}
+    logger.debug("=== Starting Payment Verification ===")
+    logger.debug(f"Received request data: {json.dumps(data, indent=2)}")
+
+    # Extract payment details
+    razorpay_order_id = data.get('razorpay_order_id')
+    razorpay_payment_id = data.get('razorpay_payment_id')
+    razorpay_signature = data.get('razorpay_signature')
+    expected_amount = data.get('amount')  # Amount from frontend for double verification
+
+    if not razorpay_payment_id:
+        logger.warning("Payment ID missing in request - payment may not have completed (possibly due to Razorpay gateway error)")
+        _record_failure(user_id, razorpay_order_id, expected_amount,
+                        Payments.STATUS_FAILED, payment_status=Payments.STATUS_FAILED)
+        return jsonify({
+            'error': 'Payment verification failed',
+            'message': 'Payment ID is missing. This usually happens when the payment gateway encounters an error (e.g., 502 Bad Gateway) and the payment does not complete.',
+            'status': 'failed'
+        }), 400
+
+    # Record the attempt as pending, committed on its own, before talking to Razorpay
+    Logs(
+        txnid=razorpay_order_id or f"FAIL_{user_id}_{int(datetime.now().timestamp())}",
+        status=Payments.STATUS_PENDING,
+        amount=float(expected_amount) / 100 if expected_amount else 0,
+        created_at=datetime.now()
+    ).save()
 
-        
+    try:
+        payment_details = _fetch_verified_payment(
+            razorpay_order_id, razorpay_payment_id, razorpay_signature, expected_amount)
+    except PaymentVerificationError as e:
+        _record_failure(user_id, razorpay_order_id, expected_amount, e.log_status, e.payment_status)
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        # Razorpay unreachable or erroring: the payment may still succeed, so leave it pending
         logger.error(f"Payment verification failed: {str(e)}")
         logger.debug("Full error details:", exc_info=True)
-        return jsonify({'error': str(e)}), 400
+        _record_failure(user_id, razorpay_order_id, expected_amount,
+                        'incomplete', payment_status=Payments.STATUS_PENDING)
+        return jsonify({'error': 'Failed to verify payment with Razorpay'}), 400
+
+    try:
+        # Every read and write below shares one connection and commits once, so the
+        # log, payment, subscription and credit updates land together or not at all
+        with unit_of_work():
+            return _apply_verified_payment(user_id, data, payment_details)
+    except PaymentVerificationError as e:
+        _record_failure(user_id, razorpay_order_id, expected_amount, e.log_status, e.payment_status)
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        logger.error(f"Error processing payment details: {str(e)}")
+        logger.debug("Full error details:", exc_info=True)
+        _record_failure(user_id, razorpay_order_id, expected_amount,
+                        'incomplete', payment_status=Payments.STATUS_FAILED)
+        return jsonify({'error': 'Failed to process payment details'}), 400
+
+
+def _apply_verified_payment(user_id, data, payment_details):
+    """Apply a verified payment. Must run inside a unit of work; anything raised rolls it back."""
+    razorpay_payment_id = data.get('razorpay_payment_id')
+    razorpay_order_id = payment_details.get('order_id') or data.get('razorpay_order_id')
+
+    user, _ = User.get_with_latest_payment(user_id)
+    if not user:
+        raise PaymentVerificationError('User not found', status_code=404)
+
+    # Find payment record using payment ID first
+    payment = Payments.get_by_provider_payment_id(razorpay_payment_id)
+
+    # If not found and we have order ID, try that
+    if not payment and razorpay_order_id:
+        payment = Payments.get_by_provider_order_id(razorpay_order_id)
+        logger.debug(f"Looking up payment by Razorpay order ID: {razorpay_order_id}")
+    if not payment:
+        raise PaymentVerificationError('Payment record not found', status_code=404)
+
+    credits = data.get('credits')
+    logger.debug(f"Calculated credits: {credits} for amount: {payment_details.get('amount')}")
+
+    user.subscription = data.get('subscription')
+    user.save()
+    logger.info(f"User subscription updated: {user.subscription}")
+
+    # Update payment status and details
+    logger.debug("Updating payment record with verification details")
+    payment.provider_payment_id = razorpay_payment_id
+    payment.provider_signature = data.get('razorpay_signature')
+    payment.notes = json.dumps({
+        **json.loads(payment.notes or '{}'),
+        'verification_data': payment_details,
+        'credits': credits
+    })
+    handle_payment(user, payment, success=True)
+    logger.debug("Payment record updated successfully")
+
+    # Update payment log with success status
+    Logs(
+        txnid=data.get('razorpay_order_id') or razorpay_order_id,
+        status=payment.status,
+        amount=payment.amount,
+        created_at=datetime.now()
+    ).save()
+    logger.debug("Payment Logs updated with success status")
+
+    # Update user credits
+    logger.debug(f"Updating credits for user ID: {user_id}")
+    previous_credits = user.credit_point
+    user.update_credits(credits)
+    logger.debug(f"Credits updated: {previous_credits} -> {user.credit_point}")
+
+    logger.info(f"Payment verification successful. Credits added: {credits}")
+    logger.debug("=== Payment Verification Completed ===")
+
+    return jsonify({
+        'status': 'success',
+        'credits_added': credits,
+        'total_credits': user.credit_point
+    }), 200
 
 @razorpay_bp.route('/history', methods=['GET'])
 @token_required
 def get_payment_history(user_id):
     """Get user's payment history"""
     try:
-        with db_transaction() as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
                     SELECT id, provider_order_id, amount, currency, 
@@ -338,7 +343,7 @@ def get_payment_history(user_id):
                 """, (user_id,))
                 payments = cursor.fetchall()
         
-        user = User.get_by_id(user_id)
+        user = User.get_by_id(user_id, only=('created_at', 'credit_point'))
 
         return jsonify({
             'payments': [{
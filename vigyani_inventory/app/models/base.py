@@ -0,0 +1,126 @@
+from ..utils.db import db_connection
+
+
+class BaseModel:
+    """Column bookkeeping shared by row-backed models.
+
+    Subclasses set TABLE and COLUMNS. COLUMN_ATTRIBUTES maps columns that are
+    stored under a different attribute name (e.g. password -> _password).
+    Loaders can leave columns out of the SELECT with only=/defer=; those
+    columns stay unloaded and are fetched from the database on first access.
+    Instances built by from_row() track which columns were assigned since
+    load (dirty_columns()) so save() can write just those.
+    """
+    TABLE = None
+    COLUMNS = ()
+    DEFERRED_COLUMNS = ()
+    COLUMN_ATTRIBUTES = {}
+    # Secrets (e.g. password hashes) kept out of model_cache rows, which may be
+    # shared through Redis; they load from the database on first access instead
+    UNCACHED_COLUMNS = ()
+
+    @classmethod
+    def attribute_for(cls, column):
+        return cls.COLUMN_ATTRIBUTES.get(column, column)
+
+    @classmethod
+    def column_for(cls, attribute):
+        for column, name in cls.COLUMN_ATTRIBUTES.items():
+            if name == attribute:
+                return column
+        if attribute in cls.COLUMNS and attribute not in cls.COLUMN_ATTRIBUTES:
+            return attribute
+        return None
+
+    @classmethod
+    def select_columns(cls, only=None, defer=None):
+        """Columns to SELECT: `only` picks a subset, `defer` drops columns
+        (DEFERRED_COLUMNS unless `only` is given). The id is always selected."""
+        requested = set(only or ()) | set(defer or ())
+        unknown = requested - set(cls.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown {cls.__name__} column(s): {', '.join(sorted(unknown))}")
+        if defer is None:
+            defer = () if only is not None else cls.DEFERRED_COLUMNS
+        return [
+            column for column in cls.COLUMNS
+            if column == 'id' or ((only is None or column in only) and column not in defer)
+        ]
+
+    @classmethod
+    def column_sql(cls, columns, alias=None):
+        prefix = f"{alias}." if alias else ''
+        return ', '.join(f"{prefix}{column}" for column in columns)
+
+    @classmethod
+    def cache_row(cls, row):
+        """row without UNCACHED_COLUMNS, for model_cache"""
+        return {column: value for column, value in row.items() if column not in cls.UNCACHED_COLUMNS}
+
+    @classmethod
+    def from_row(cls, row):
+        """Build an instance from a (possibly partial) row; missing columns load lazily"""
+        instance = cls(**row)
+        for column in cls.COLUMNS:
+            if column not in row:
+                instance.__dict__.pop(cls.attribute_for(column), None)
+        instance.mark_clean()
+        return instance
+
+    def __setattr__(self, name, value):
+        dirty = self.__dict__.get('_dirty')
+        if dirty is not None:
+            column = type(self).column_for(name)
+            if column is not None and (name not in self.__dict__ or self.__dict__[name] != value):
+                dirty.add(column)
+        super().__setattr__(name, value)
+
+    def mark_clean(self, *columns):
+        """Start (or reset) change tracking; with columns, forget just those changes"""
+        if columns and self.__dict__.get('_dirty') is not None:
+            self._dirty.difference_update(columns)
+        else:
+            self.__dict__['_dirty'] = set()
+
+    def is_tracked(self):
+        return self.__dict__.get('_dirty') is not None
+
+    def dirty_columns(self):
+        """Columns assigned a different value since load, in COLUMNS order"""
+        dirty = self.__dict__.get('_dirty') or ()
+        return [column for column in self.COLUMNS if column in dirty]
+
+    def loaded_columns(self):
+        """Columns that hold a value on this instance, whether loaded or assigned"""
+        return [column for column in self.COLUMNS if self.attribute_for(column) in self.__dict__]
+
+    def columns_to_update(self, exclude=('id', 'created_at', 'updated_at')):
+        """Columns an UPDATE should write: the dirty ones when tracked, else every loaded one"""
+        columns = self.dirty_columns() if self.is_tracked() else self.loaded_columns()
+        return [column for column in columns if column not in exclude]
+
+    def load_columns(self, columns):
+        """Fetch unloaded columns for this row in one query"""
+        columns = [column for column in columns if self.attribute_for(column) not in self.__dict__]
+        if not columns:
+            return
+        row = None
+        if self.__dict__.get('id') is not None:
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT {self.column_sql(columns)} FROM {self.TABLE} WHERE id = %s", (self.id,))
+                    row = cursor.fetchone()
+        for column in columns:
+            self.__dict__[self.attribute_for(column)] = row.get(column) if row else None
+
+    def __getattr__(self, name):
+        # Only reached when normal lookup fails, i.e. for columns left out of the SELECT
+        if isinstance(getattr(type(self), name, None), property):
+            # Let a property's own AttributeError through unchanged
+            return object.__getattribute__(self, name)
+        column = type(self).column_for(name)
+        if column is None or name.startswith('__'):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        self.load_columns([column])
+        return self.__dict__[name]
@@ -39,6 +39,69 @@ class Logs:
                 logs = cursor.fetchall()
                 return [cls(**log) for log in logs]
     
+    LIST_COLUMNS = ('id', 'txnid', 'status', 'amount', 'created_at')
+
+    @staticmethod
+    def _filters(status=None, start=None, end=None):
+        """WHERE clause and params for the status / created_at range filters"""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = %s")
+            params.append(status)
+        if start:
+            clauses.append("created_at >= %s")
+            params.append(start)
+        if end:
+            clauses.append("created_at < %s")
+            params.append(end)
+        return clauses, params
+
+    @classmethod
+    def get_page(cls, limit, after=None, status=None, start=None, end=None):
+        """One page of logs, newest first, using keyset pagination on (created_at, id).
+
+        `after` is the (created_at, id) of the last log on the previous page.
+        Returns (logs, next_key); next_key is None on the last page.
+        """
+        clauses, params = cls._filters(status, start, end)
+        if after:
+            created_at, log_id = after
+            clauses.append("(created_at < %s OR (created_at = %s AND id < %s))")
+            params += [created_at, created_at, log_id]
+        query = f"SELECT {', '.join(cls.LIST_COLUMNS)} FROM payment_logs"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+
+        logs = [cls(**log) for log in rows[:limit]]
+        next_key = (logs[-1].created_at, logs[-1].id) if len(rows) > limit else None
+        return logs, next_key
+
+    @classmethod
+    def get_status_summary(cls, start=None, end=None):
+        """Count and total amount per status, aggregated in the database"""
+        clauses, params = cls._filters(start=start, end=end)
+        query = "SELECT status, COUNT(*) AS count, COALESCE(SUM(amount), 0) AS amount FROM payment_logs"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " GROUP BY status ORDER BY status"
+
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return [{
+                    'status': row['status'],
+                    'count': row['count'],
+                    'amount': float(row['amount'])
+                } for row in cursor.fetchall()]
+
     # @classmethod
     # def get_log_by_email(cls,email):
     #     """Get payment logs through email id"""
@@ -76,7 +139,9 @@ class Logs:
                         txnid VARCHAR(255) UNIQUE NOT NULL,
                         status VARCHAR(50) NOT NULL,
                         amount DECIMAL(10, 2) NOT NULL,
-                        created_at DATETIME NOT NULL
+                        created_at DATETIME NOT NULL,
+                        INDEX idx_created_at (created_at, id),
+                        INDEX idx_status_created_at (status, created_at, id)
                     )
                 """)
                         
\ No newline at end of file
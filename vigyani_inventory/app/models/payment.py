@@ -1,7 +1,9 @@
 from datetime import datetime
-from ..utils.db import db_transaction, db_connection
+from ..utils.db import db_transaction, db_connection, after_commit, current_unit_of_work
+from ..utils import model_cache
+from .base import BaseModel
 
-class Payments:
+class Payments(BaseModel):
     # Payment status constants
     STATUS_INITIATED = 'initiated'
     STATUS_CREATED = 'created'
@@ -14,6 +16,13 @@ class Payments:
     PROVIDER_RAZORPAY = 'razorpay'
     PROVIDER_PAYU = 'payu'
 
+    TABLE = 'payments'
+    COLUMNS = (
+        'id', 'user_id', 'order_id', 'amount', 'currency', 'receipt', 'notes', 'status',
+        'provider', 'provider_payment_id', 'provider_order_id', 'provider_signature',
+        'created_at', 'updated_at'
+    )
+
     def __init__(self, id=None, user_id=None, order_id=None, payment_id=None, amount=None,
                  currency=None, receipt=None, notes=None, status=None,
                  provider=None, provider_payment_id=None, provider_order_id=None,
@@ -36,26 +45,22 @@ class Payments:
 
     def save(self):
         """Save payment to database"""
+        if self.id:
+            columns = self.columns_to_update()
+            if not columns:
+                # Nothing changed since load; skip the write and its row lock
+                return self
         with db_transaction() as conn:
             with conn.cursor() as cursor:
                 if self.id:
-                    # Update existing payment
-                    cursor.execute("""
-                        UPDATE payments 
-                        SET user_id = %s, order_id = %s,
-                            amount = %s, currency = %s, receipt = %s,
-                            notes = %s, status = %s, provider = %s,
-                            provider_payment_id = %s, provider_order_id = %s,
-                            provider_signature = %s, updated_at = %s
-                        WHERE id = %s
-                    """, (
-                        self.user_id, self.order_id,
-                        self.amount, self.currency, self.receipt,
-                        self.notes, self.status, self.provider,
-                        self.provider_payment_id, self.provider_order_id,
-                        self.provider_signature, datetime.now(),
-                        self.id
-                    ))
+                    # Update existing payment; only changed columns are written
+                    now = datetime.now()
+                    assignments = ', '.join(f"{column} = %s" for column in columns + ['updated_at'])
+                    cursor.execute(
+                        f"UPDATE payments SET {assignments} WHERE id = %s",
+                        [getattr(self, column) for column in columns] + [now, self.id]
+                    )
+                    self.updated_at = now
                 else:
                     # Create new payment
                     cursor.execute("""
@@ -73,19 +78,36 @@ class Payments:
                         self.provider_signature, self.created_at, self.updated_at
                     ))
                     self.id = cursor.lastrowid
+        self.mark_clean()
+        after_commit(model_cache.invalidate, 'Payments', self.id)
         return self
 
     @classmethod
     def get_by_id(cls, payment_id):
         """Get payment by ID"""
+        cache = model_cache.cache_for('Payments')
+        if cache is not None:
+            payment_data = cache.get(payment_id)
+            if payment_data is not None:
+                return cls.from_row(payment_data)
         with db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM payments WHERE id = %s", (payment_id,))
                 payment_data = cursor.fetchone()
                 if payment_data:
-                    return cls(**payment_data)
+                    # Inside a unit of work this row may be uncommitted; don't cache what could roll back
+                    if cache is not None and current_unit_of_work() is None:
+                        cache.set(payment_id, cls.cache_row(payment_data))
+                    return cls.from_row(payment_data)
         return None
 
+    @classmethod
+    def from_prefixed_row(cls, row, prefix):
+        """Build a payment from the prefixed columns of a joined row, or None if the join found nothing"""
+        if row.get(f"{prefix}id") is None:
+            return None
+        return cls.from_row({column: row[f"{prefix}{column}"] for column in cls.COLUMNS})
+
     @classmethod
     def get_latest_by_user_id(cls, user_id):
         """Fetch the latest payment details for a user"""
@@ -96,7 +118,7 @@ class Payments:
                     (user_id,)
                 )
                 payment = cursor.fetchone()
-                return cls(**payment) if payment else None
+                return cls.from_row(payment) if payment else None
 
     @classmethod
     def get_by_order_id(cls, order_id):
@@ -109,7 +131,7 @@ class Payments:
                 """, (order_id,))
                 payment_data = cursor.fetchone()
                 if payment_data:
-                    return cls(**payment_data)
+                    return cls.from_row(payment_data)
         return None
 
     @classmethod
@@ -120,7 +142,7 @@ class Payments:
                 cursor.execute("SELECT * FROM payments WHERE provider_order_id = %s", (provider_order_id,))
                 payment_data = cursor.fetchone()
                 if payment_data:
-                    return cls(**payment_data)
+                    return cls.from_row(payment_data)
         return None
 
     @classmethod
@@ -131,7 +153,7 @@ class Payments:
                 cursor.execute("SELECT * FROM payments WHERE provider_payment_id = %s", (provider_payment_id,))
                 payment_data = cursor.fetchone()
                 if payment_data:
-                    return cls(**payment_data)
+                    return cls.from_row(payment_data)
         return None
 
     @classmethod
@@ -154,7 +176,7 @@ class Payments:
             with conn.cursor() as cursor:
                 cursor.execute(query, tuple(params))
                 payments = cursor.fetchall()
-                return [cls(**payment) for payment in payments]
+                return [cls.from_row(payment) for payment in payments]
 
     @staticmethod
     def create_tables():
@@ -177,8 +199,9 @@ class Payments:
                         provider_signature VARCHAR(512),
                         created_at DATETIME NOT NULL,
                         updated_at DATETIME NOT NULL,
-                        INDEX idx_user_id (user_id),
-                        INDEX idx_order_id (order_id),
+                        INDEX idx_user_updated_at (user_id, updated_at),
+                        INDEX idx_user_created_at (user_id, created_at),
+                        INDEX idx_provider_payment_id (provider_payment_id),
                         INDEX idx_provider_order_id (provider_order_id),
                         INDEX idx_status (status),
                         INDEX idx_provider (provider),
@@ -1,10 +1,24 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from ..utils.db import db_transaction, db_connection
+from ..utils.db import db_transaction, db_connection, after_commit, current_unit_of_work
+from ..utils import model_cache
+from .base import BaseModel
+from .payment import Payments
 from datetime import datetime
 
-class User:
+class User(BaseModel):
+    TABLE = 'mino.users'
+    COLUMNS = (
+        'id', 'username', 'email', 'password', 'phone', 'firstname', 'lastname', 'image',
+        'image_key', 'image_version', 'credit_point', 'created_at', 'updated_at', 'subscription', 'tenant_id'
+    )
+    # Profile images are stored by mino-ai in object storage (image_key/image_version);
+    # the legacy image BLOB column only loads when something reads user.image
+    DEFERRED_COLUMNS = ('image',)
+    COLUMN_ATTRIBUTES = {'password': '_password'}
+    UNCACHED_COLUMNS = ('password',)
+
     def __init__(self, id=None, username=None, email=None, password=None, 
-                 phone=None, firstname=None, lastname=None, image=None,
+                 phone=None, firstname=None, lastname=None, image=None, image_key=None, image_version=None,
                  credit_point=0, created_at=None, updated_at=None, subscription='free', tenant_id=None):
         self.tenant_id = tenant_id
         self.id = id
@@ -15,6 +29,8 @@ class User:
         self.firstname = firstname
         self.lastname = lastname
         self.image = image
+        self.image_key = image_key
+        self.image_version = image_version
         self.credit_point = credit_point
         self.created_at = created_at or datetime.now()
         self.updated_at = updated_at or datetime.now()
@@ -46,17 +62,18 @@ class User:
             return False
 
     @classmethod
-    def get_by_username(cls, username):
+    def get_by_username(cls, username, only=None, defer=None):
         import logging
         logger = logging.getLogger(__name__)
         try:
+            columns = cls.column_sql(cls.select_columns(only, defer))
             with db_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT * FROM mino.users WHERE username = %s", (username,))
+                    cursor.execute(f"SELECT {columns} FROM mino.users WHERE username = %s", (username,))
                     user_data = cursor.fetchone()
                     if user_data:
                         logger.debug(f"Found user data for username: {username}")
-                        return cls(**user_data)
+                        return cls.from_row(user_data)
                     else:
                         logger.debug(f"No user found for username: {username}")
         except Exception as e:
@@ -64,17 +81,18 @@ class User:
         return None
 
     @classmethod
-    def get_by_email(cls, email):
+    def get_by_email(cls, email, only=None, defer=None):
         import logging
         logger = logging.getLogger(__name__)
         try:
+            columns = cls.column_sql(cls.select_columns(only, defer))
             with db_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT * FROM mino.users WHERE email = %s", (email,))
+                    cursor.execute(f"SELECT {columns} FROM mino.users WHERE email = %s", (email,))
                     user_data = cursor.fetchone()
                     if user_data:
                         logger.debug(f"Found user data for email: {email}")
-                        return cls(**user_data)
+                        return cls.from_row(user_data)
                     else:
                         logger.debug(f"No user found for email: {email}")
         except Exception as e:
@@ -82,73 +100,115 @@ class User:
         return None
 
     @classmethod
-    def get_by_id(cls, user_id):
+    def get_by_id(cls, user_id, only=None, defer=None):
+        """Get user by id. The image is deferred unless requested via only=/defer=()"""
+        # Only the default projection is cached, so a hit always has the same columns
+        cache = model_cache.cache_for('User') if only is None and defer is None else None
+        if cache is not None:
+            user_data = cache.get(user_id)
+            if user_data is not None:
+                return cls.from_row(user_data)
+        columns = cls.column_sql(cls.select_columns(only, defer))
         with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM mino.users WHERE id = %s", (user_id,))
+                cursor.execute(f"SELECT {columns} FROM mino.users WHERE id = %s", (user_id,))
                 user_data = cursor.fetchone()
                 if user_data:
-                    return cls(**user_data)
+                    # Inside a unit of work this row may be uncommitted; don't cache what could roll back
+                    if cache is not None and current_unit_of_work() is None:
+                        cache.set(user_id, cls.cache_row(user_data))
+                    return cls.from_row(user_data)
         return None
 
     @classmethod
-    def get_by_username_or_email(cls, identifier):
+    def get_with_latest_payment(cls, user_id):
+        """Get a user and their most recently updated payment in one query.
+
+        Returns a (user, payment) tuple; either may be None.
+        """
+        user_columns = cls.column_sql(cls.select_columns(), alias='u')
+        payment_columns = ', '.join(f"p.{column} AS payment__{column}" for column in Payments.COLUMNS)
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {user_columns}, {payment_columns}
+                    FROM mino.users u
+                    LEFT JOIN payments p ON p.id = (
+                        SELECT id FROM payments
+                        WHERE user_id = u.id
+                        ORDER BY updated_at DESC
+                        LIMIT 1
+                    )
+                    WHERE u.id = %s
+                """, (user_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None, None
+                payment = Payments.from_prefixed_row(row, 'payment__')
+                user_data = {key: value for key, value in row.items() if not key.startswith('payment__')}
+                return cls.from_row(user_data), payment
+
+    @classmethod
+    def get_by_username_or_email(cls, identifier, only=None, defer=None):
         """Get user by either username or email"""
+        columns = cls.column_sql(cls.select_columns(only, defer))
         with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT * FROM mino.users 
+                cursor.execute(f"""
+                    SELECT {columns} FROM mino.users 
                     WHERE username = %s OR email = %s
                 """, (identifier, identifier))
                 user_data = cursor.fetchone()
                 if user_data:
-                    return cls(**user_data)
+                    return cls.from_row(user_data)
         return None
 
     @classmethod
-    def get_by_tenant_id(cls, tenant_id):
+    def get_by_tenant_id(cls, tenant_id, only=None, defer=None):
         """Get all users by tenant_id"""
+        columns = cls.column_sql(cls.select_columns(only, defer))
         with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM mino.users WHERE tenant_id = %s", (tenant_id,))
+                cursor.execute(f"SELECT {columns} FROM mino.users WHERE tenant_id = %s", (tenant_id,))
                 users_data = cursor.fetchall()
                 if users_data:
-                    return [cls(**user_data) for user_data in users_data]
+                    return [cls.from_row(user_data) for user_data in users_data]
         return []
 
     def save(self):
+        if self.id:
+            columns = self.columns_to_update()
+            if not columns:
+                # Nothing changed since load; skip the write and its row lock
+                return self
         now = datetime.now()
         with db_transaction() as conn:
             with conn.cursor() as cursor:
                 if self.id:
-                    # Update existing user
-                    cursor.execute("""
-                        UPDATE mino.users 
-                        SET username = %s, password = %s, credit_point = %s, email = %s,
-                            phone = %s, firstname = %s, lastname = %s, image = %s,
-                            updated_at = %s, subscription = %s, tenant_id = %s
-                        WHERE id = %s
-                    """, (
-                        self.username, self._password, self.credit_point, self.email,
-                        self.phone, self.firstname, self.lastname, self.image,
-                        now, self.subscription, self.tenant_id, self.id
-                    ))
+                    # Update existing user; only changed columns are written
+                    assignments = ', '.join(f"{column} = %s" for column in columns + ['updated_at'])
+                    cursor.execute(
+                        f"UPDATE mino.users SET {assignments} WHERE id = %s",
+                        [getattr(self, self.attribute_for(column)) for column in columns] + [now, self.id]
+                    )
                 else:
                     # Create new user
                     cursor.execute("""
                         INSERT INTO mino.users (
                             username, password, credit_point, email,
-                            phone, firstname, lastname, image,
+                            phone, firstname, lastname, image_key, image_version,
                             created_at, updated_at, subscription, tenant_id
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """, (
                         self.username, self._password, self.credit_point, self.email,
-                        self.phone, self.firstname, self.lastname, self.image,
+                        self.phone, self.firstname, self.lastname, self.image_key, self.image_version,
                         now, now, self.subscription, self.tenant_id
                     ))
                     self.id = cursor.lastrowid
                     self.created_at = now
                 self.updated_at = now
+        self.mark_clean()
+        after_commit(model_cache.invalidate, 'User', self.id)
         return self
 
     def update_credits(self, amount):
@@ -163,6 +223,9 @@ class User:
                 """, (amount, now, self.id))
                 self.credit_point += amount
                 self.updated_at = now
+        # Already written above; a later save() shouldn't write them again
+        self.mark_clean('credit_point', 'updated_at')
+        after_commit(model_cache.invalidate, 'User', self.id)
         return self
 
     @staticmethod
@@ -181,6 +244,8 @@ class User:
                         firstname VARCHAR(255),
                         lastname VARCHAR(255),
                         image MEDIUMBLOB,
+                        image_key VARCHAR(512),
+                        image_version CHAR(32),
                         subscription VARCHAR(50) DEFAULT 'free',
                         tenant_id VARCHAR(255),
                         created_at DATETIME NOT NULL,
@@ -0,0 +1,133 @@
+import time
+import hashlib
+import logging
+import threading
+from flask import current_app
+from ..models.products import Products
+from ..utils.shared_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Yearly plans are billed as 12 months at this fraction of the monthly price (15% discount)
+YEARLY_PRICE_FACTOR = 0.85
+
+
+class CatalogSnapshot:
+    """The product list as the response body bytes plus the strong ETag derived from them"""
+
+    __slots__ = ('body', 'etag', 'count', 'built_at', 'expires_at')
+
+    def __init__(self, body, count, ttl):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.count = count
+        self.built_at = time.time()
+        self.expires_at = time.monotonic() + ttl
+
+
+class CatalogCache:
+    """In-process cache of the serialized catalog.
+
+    The catalog changes about once a month, so each worker builds it once per
+    TTL (or after invalidate()) and every other request is answered from the
+    stored bytes without touching MySQL. A single lock makes concurrent misses
+    wait for one rebuild instead of each querying the table.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        """The current snapshot, rebuilding it if it expired; None when there are no products"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.expires_at <= time.monotonic():
+                self.misses += 1
+                snapshot = self._snapshot = build_catalog()
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+        logger.info("Product catalog cache invalidated")
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'products': snapshot.count if snapshot else None,
+            'etag': snapshot.etag if snapshot else None,
+            'built_at': snapshot.built_at if snapshot else None,
+        }
+
+
+def serialize_product(product):
+    """The pricing-page representation of one product"""
+    description_list = [feature for feature in (product.first, product.second, product.third, product.fourth) if feature]
+    month_amount = int(float(product.amount))
+    month_credit = int(float(product.credit))
+    return {
+        'id': product.id,
+        'type': product.type,
+        'month_amount': month_amount,
+        'month_credit': month_credit,
+        'year_credit': month_credit * 12,
+        'year_amount': month_amount * 12 * YEARLY_PRICE_FACTOR,
+        'description': description_list,
+        'period': product.period
+    }
+
+
+def _shared_cache():
+    # The snapshot already is the per-process tier; only Redis adds anything
+    return get_cache('products') if current_app.config.get('CACHE_BACKEND') == 'redis' else None
+
+
+def serialize_catalog():
+    """{'body': JSON bytes, 'count': products}, or None when the table is empty"""
+    products = Products.get_product_list()
+    if not products:
+        return None
+    body = current_app.json.dumps(
+        {'products': [serialize_product(product) for product in products]}, separators=(',', ':')).encode('utf-8')
+    return {'body': body, 'count': len(products)}
+
+
+def build_catalog():
+    """Query and serialize the catalog once; returns None when the table is empty (nothing is cached).
+
+    With the Redis tier, one worker across the fleet queries MySQL and the
+    rest pick its bytes up from Redis; their snapshots then only live for
+    CACHE_LOCAL_TTL so an invalidation reaches every worker quickly.
+    """
+    ttl = current_app.config.get('CATALOG_CACHE_TTL', 300)
+    shared = _shared_cache()
+    if shared is not None:
+        catalog = shared.get_or_set('catalog', serialize_catalog, ttl=ttl)
+        ttl = min(ttl, current_app.config.get('CACHE_LOCAL_TTL', 5))
+    else:
+        catalog = serialize_catalog()
+    if catalog is None:
+        return None
+    snapshot = CatalogSnapshot(catalog['body'], catalog['count'], ttl)
+    logger.info(f"Product catalog cached: {snapshot.count} product(s), {len(snapshot.body)} bytes, etag {snapshot.etag}")
+    return snapshot
+
+
+catalog_cache = CatalogCache()
+
+
+def invalidate_catalog():
+    """Drop the cached catalog; call after changing the products table"""
+    catalog_cache.invalidate()
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete('catalog')
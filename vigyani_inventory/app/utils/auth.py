@@ -39,4 +39,16 @@ def token_required(f):
             logger.error(f"Error processing token: {str(e)}")
             return jsonify({'error': 'Token validation failed'}), 401
 
-    return decorated
\ No newline at end of file
+    return decorated
+
+
+def admin_required(f):
+    """token_required, limited to the user ids listed in ADMIN_USER_IDS"""
+    @wraps(f)
+    def admin_only(user_id, *args, **kwargs):
+        if str(user_id) not in current_app.config.get('ADMIN_USER_IDS', ()):
+            logger.warning(f"User {user_id} denied access to admin endpoint {request.endpoint}")
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(user_id, *args, **kwargs)
+
+    return token_required(admin_only)
@@ -0,0 +1,58 @@
+import json
+import base64
+from datetime import datetime, timedelta
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a ?limit= value, clamped to 1..maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for keyset pagination on (sort_value, id)"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); returns (datetime, id) or raises ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def stream_json_page(key, items, serialize, next_cursor=None):
+    """Yield {"<key>": [...], "next_cursor": ...} one item at a time so the body is never built in memory"""
+    yield f'{{"{key}":['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(serialize(item), default=str)
+    yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+
+def parse_date_range(start=None, end=None):
+    """Parse ?from= / ?to= (ISO dates or datetimes) into a [start, end) range.
+
+    A bare date for `end` includes that whole day.
+    """
+    try:
+        start = datetime.fromisoformat(start) if start else None
+        if end:
+            end_date = datetime.fromisoformat(end)
+            end = end_date + timedelta(days=1) if len(end) == 10 else end_date
+    except ValueError:
+        raise ValueError("from/to must be ISO dates (YYYY-MM-DD) or datetimes")
+    return start, end or None
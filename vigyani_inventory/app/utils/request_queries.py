@@ -0,0 +1,115 @@
+import json
+import time
+import logging
+from collections import Counter
+from flask import g, request, has_request_context
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (when budgets are enforced, e.g. under app.testing) if an endpoint runs too many statements"""
+
+
+class RequestQueries:
+    """SQL statements, connection checkouts and DB time attributed to one request"""
+
+    __slots__ = ('statements', 'connections', 'db_ms', 'acquire_ms', 'shapes', 'started')
+
+    def __init__(self):
+        self.statements = 0
+        self.connections = 0
+        self.db_ms = 0.0
+        self.acquire_ms = 0.0
+        self.shapes = Counter()
+        self.started = time.perf_counter()
+
+    def repeated(self, threshold):
+        """Statement shapes run at least threshold times: the N+1 suspects"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def current():
+    """Counters for the active request, or None outside one"""
+    if not has_request_context():
+        return None
+    return g.get('_request_queries')
+
+
+def note_query(fingerprint, elapsed_ms):
+    stats = current()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_ms += elapsed_ms
+        stats.shapes[fingerprint] += 1
+
+
+def note_connection(elapsed_ms):
+    stats = current()
+    if stats is not None:
+        stats.connections += 1
+        stats.acquire_ms += elapsed_ms
+
+
+def query_budget(max_statements):
+    """Cap the SQL statements a view may run per request; apply it below @route"""
+    def decorator(view):
+        view._query_budget = max_statements
+        return view
+    return decorator
+
+
+def _budget_for(app):
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    budget = getattr(view, '_query_budget', None)
+    return app.config.get('DB_QUERY_BUDGETS', {}).get(request.endpoint, budget)
+
+
+def init_app(app):
+    """Count statements per request; report via log line, optional X-DB-Queries header and budgets"""
+
+    @app.before_request
+    def _start_request_queries():
+        g._request_queries = RequestQueries()
+
+    @app.after_request
+    def _report_request_queries(response):
+        stats = g.pop('_request_queries', None)
+        if stats is None:
+            return response
+
+        repeated = stats.repeated(app.config.get('DB_N_PLUS_ONE_THRESHOLD', 3))
+        if stats.statements:
+            record = {
+                'event': 'db_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'statements': stats.statements,
+                'connections': stats.connections,
+                'db_ms': round(stats.db_ms, 3),
+                'acquire_ms': round(stats.acquire_ms, 3),
+                'request_ms': round((time.perf_counter() - stats.started) * 1000, 3),
+                'repeated': [{'fingerprint': shape, 'count': count} for shape, count in repeated],
+            }
+            if repeated:
+                logger.warning(json.dumps(record))
+            else:
+                logger.info(json.dumps(record))
+
+        if app.config.get('DB_DEBUG_HEADER'):
+            response.headers['X-DB-Queries'] = (
+                f"statements={stats.statements}; connections={stats.connections}; "
+                f"db_ms={stats.db_ms:.1f}; repeated={len(repeated)}"
+            )
+
+        budget = _budget_for(app)
+        if budget is not None and stats.statements > budget:
+            message = (f"{request.endpoint} ran {stats.statements} SQL statements, "
+                       f"budget is {budget}: {dict(stats.shapes)}")
+            enforce = app.config.get('DB_QUERY_BUDGET_ENFORCE')
+            if app.testing if enforce is None else enforce:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,403 @@
+import json
+import time
+import uuid
+import zlib
+import logging
+import threading
+from decimal import Decimal
+from datetime import datetime, date
+from collections import OrderedDict
+from flask import current_app, has_app_context
+
+try:
+    import msgpack
+except ImportError:  # values fall back to JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# First byte of every stored value: how the rest is encoded
+FORMAT_MSGPACK = b'm'
+FORMAT_JSON = b'j'
+COMPRESSED = 0x80           # high bit set: payload is zlib-compressed
+COMPRESS_MIN_BYTES = 1024   # smaller values aren't worth the CPU
+
+# msgpack extension types for values MySQL rows carry
+EXT_DATETIME = 1
+EXT_DATE = 2
+EXT_DECIMAL = 3
+
+# Compare-and-delete, so a lock holder that overran its TTL can't release someone else's lock
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode('ascii'))
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode('ascii'))
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode('ascii'))
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _msgpack_ext_hook(code, data):
+    text = data.decode('ascii')
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(text)
+    if code == EXT_DATE:
+        return date.fromisoformat(text)
+    if code == EXT_DECIMAL:
+        return Decimal(text)
+    return msgpack.ExtType(code, data)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, bytes):
+        return {'__bytes__': value.hex()}
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1:
+        (tag, text), = obj.items()
+        if tag == '__datetime__':
+            return datetime.fromisoformat(text)
+        if tag == '__date__':
+            return date.fromisoformat(text)
+        if tag == '__decimal__':
+            return Decimal(text)
+        if tag == '__bytes__':
+            return bytes.fromhex(text)
+    return obj
+
+
+def encode(value):
+    """Serialize value (msgpack when installed, else JSON), zlib-compressing large payloads"""
+    if msgpack is not None:
+        fmt, payload = FORMAT_MSGPACK, msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    else:
+        fmt, payload = FORMAT_JSON, json.dumps(value, default=_json_default, separators=(',', ':')).encode('utf-8')
+    header = fmt[0]
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            header, payload = header | COMPRESSED, compressed
+    return bytes([header]) + payload
+
+
+def decode(data):
+    header, payload = data[0], data[1:]
+    if header & COMPRESSED:
+        header, payload = header & ~COMPRESSED, zlib.decompress(payload)
+    if header == FORMAT_MSGPACK[0]:
+        if msgpack is None:
+            raise ValueError("Cached value is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False)
+    if header == FORMAT_JSON[0]:
+        return json.loads(payload.decode('utf-8'), object_hook=_json_object_hook)
+    raise ValueError(f"Unknown cache value format {header!r}")
+
+
+class LocalTier:
+    """Per-process L1: a TTL'd LRU of decoded values"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisTier:
+    """Shared L2. Redis errors are logged and treated as misses; after one the tier
+    is skipped for retry_after seconds so an outage doesn't add a timeout to every request."""
+
+    def __init__(self, client, retry_after=30):
+        self.client = client
+        self.retry_after = retry_after
+        self._down_until = 0
+        self._release = client.register_script(_RELEASE_LOCK)
+        self.errors = 0
+
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def _failed(self, operation, error):
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_after
+        logger.warning(f"Redis cache {operation} failed, bypassing it for {self.retry_after}s: {str(error)}")
+
+    def get(self, key):
+        if not self.available():
+            return None
+        try:
+            data = self.client.get(key)
+        except Exception as e:
+            self._failed('get', e)
+            return None
+        if data is None:
+            return None
+        try:
+            return decode(data)
+        except Exception as e:
+            logger.warning(f"Discarding undecodable cache entry {key}: {str(e)}")
+            return None
+
+    def set(self, key, value, ttl):
+        if not self.available():
+            return
+        try:
+            self.client.set(key, encode(value), px=int(ttl * 1000))
+        except Exception as e:
+            self._failed('set', e)
+
+    def delete(self, *keys):
+        if not self.available():
+            return
+        try:
+            self.client.delete(*keys)
+        except Exception as e:
+            self._failed('delete', e)
+
+    def delete_prefix(self, prefix):
+        if not self.available():
+            return
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=f"{prefix}*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception as e:
+            self._failed('delete', e)
+
+    def acquire_lock(self, key, ttl):
+        """A token if we now hold the lock, None if someone else does (or Redis is unavailable)"""
+        if not self.available():
+            return None
+        token = uuid.uuid4().hex
+        try:
+            return token if self.client.set(key, token, nx=True, px=int(ttl * 1000)) else None
+        except Exception as e:
+            self._failed('lock', e)
+            return None
+
+    def release_lock(self, key, token):
+        try:
+            self._release(keys=[key], args=[token])
+        except Exception as e:
+            logger.warning(f"Failed to release cache lock {key}: {str(e)}")
+
+
+class SharedCache:
+    """Namespaced two-tier cache: in-process L1 in front of an optional Redis L2.
+
+    Keys are stored as <prefix>:<namespace>:<key>, so services configured
+    with the same CACHE_KEY_PREFIX share entries. L1 entries live at most
+    local_ttl seconds, which bounds how long a worker can serve a value
+    another worker or service has since replaced or deleted. None is never
+    cached.
+    """
+
+    def __init__(self, namespace, prefix, ttl, local_ttl, local, remote=None, lock_ttl=10):
+        self.namespace = namespace
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local = local
+        self.remote = remote
+        self.lock_ttl = lock_ttl
+        self.hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def key(self, key):
+        return f"{self.prefix}:{self.namespace}:{key}"
+
+    def get(self, key):
+        full_key = self.key(key)
+        value = self.local.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.remote is not None:
+            value = self.remote.get(full_key)
+            if value is not None:
+                self.remote_hits += 1
+                self.local.set(full_key, value, self.local_ttl)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        ttl = ttl or self.ttl
+        full_key = self.key(key)
+        self.local.set(full_key, value, min(ttl, self.local_ttl))
+        if self.remote is not None:
+            self.remote.set(full_key, value, ttl)
+
+    def delete(self, key):
+        full_key = self.key(key)
+        self.local.delete(full_key)
+        if self.remote is not None:
+            self.remote.delete(full_key)
+
+    def clear(self):
+        """Drop this namespace's entries (this worker's L1 and all of L2)"""
+        self.local.clear()
+        if self.remote is not None:
+            self.remote.delete_prefix(f"{self.prefix}:{self.namespace}:")
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Read-through with stampede protection.
+
+        On a miss one caller (across all workers sharing Redis) takes a short
+        lock and runs loader(); the others poll for the value it stores,
+        and load it themselves only if the lock holder doesn't finish within
+        lock_ttl.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        if self.remote is None:
+            return self._load(key, loader, ttl)
+
+        lock_key = f"{self.key(key)}:lock"
+        token = self.remote.acquire_lock(lock_key, self.lock_ttl)
+        if token is not None or not self.remote.available():
+            try:
+                return self._load(key, loader, ttl)
+            finally:
+                if token is not None:
+                    self.remote.release_lock(lock_key, token)
+
+        give_up = time.monotonic() + self.lock_ttl
+        delay = 0.02
+        while time.monotonic() < give_up:
+            time.sleep(delay)
+            value = self.remote.get(self.key(key))
+            if value is not None:
+                self.remote_hits += 1
+                self.local.set(self.key(key), value, self.local_ttl)
+                return value
+            delay = min(delay * 2, 0.25)
+        logger.warning(f"Gave up waiting on cache fill for {self.key(key)}; loading it here")
+        return self._load(key, loader, ttl)
+
+    def _load(self, key, loader, ttl):
+        self.loads += 1
+        value = loader()
+        self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        return {
+            'backend': 'redis' if self.remote is not None else 'memory',
+            'hits': self.hits,
+            'remote_hits': self.remote_hits,
+            'misses': self.misses,
+            'loads': self.loads,
+        }
+
+
+_caches = {}
+_remote = None
+_lock = threading.Lock()
+
+
+def _redis_tier(config):
+    global _remote
+    if _remote is None:
+        import redis
+        url = config.get('CACHE_REDIS_URL')
+        timeout = config.get('CACHE_REDIS_TIMEOUT', 0.5)
+        if url:
+            client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        else:
+            client = redis.Redis(
+                host=config.get('REDIS_HOST'),
+                port=int(config.get('REDIS_PORT') or 6379),
+                username=config.get('REDIS_USERNAME'),
+                password=config.get('REDIS_PASSWORD'),
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout
+            )
+        _remote = RedisTier(client, retry_after=config.get('CACHE_REDIS_RETRY_SECONDS', 30))
+    return _remote
+
+
+def get_cache(namespace, ttl=None):
+    """The SharedCache for namespace, or None when CACHE_BACKEND is 'none' (or outside an app context).
+
+    CACHE_BACKEND 'memory' keeps only the per-process tier; 'redis' adds the
+    shared one.
+    """
+    if not has_app_context():
+        return None
+    config = current_app.config
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'none':
+        return None
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = SharedCache(
+                    namespace,
+                    prefix=config.get('CACHE_KEY_PREFIX', 'mino'),
+                    ttl=ttl or config.get('CACHE_DEFAULT_TTL', 300),
+                    local_ttl=config.get('CACHE_LOCAL_TTL', 5),
+                    local=LocalTier(config.get('CACHE_LOCAL_MAX_ENTRIES', 10000)),
+                    remote=_redis_tier(config) if backend == 'redis' else None,
+                    lock_ttl=config.get('CACHE_LOCK_SECONDS', 10)
+                )
+    return cache
+
+
+def stats():
+    return {namespace: cache.stats() for namespace, cache in list(_caches.items())}
@@ -0,0 +1,38 @@
+"""Export payments / payment_logs to CSV or NDJSON without loading them into memory.
+
+    python export_data.py payments --format csv --from 2024-04-01 --to 2024-06-30 -o q1.csv
+"""
+import sys
+import argparse
+from app import create_app
+from app.services.export_service import export, EXPORTS, FORMATS
+from app.utils.pagination import parse_date_range
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dataset', choices=sorted(EXPORTS))
+    parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--from', dest='start', help='created_at lower bound (ISO date or datetime)')
+    parser.add_argument('--to', dest='end', help='created_at upper bound; a bare date includes that day')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--env', choices=['dev', 'prod'], default='prod')
+    args = parser.parse_args()
+
+    try:
+        start, end = parse_date_range(args.start, args.end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    app = create_app(args.env)
+    with app.app_context():
+        chunks, _ = export(args.dataset, args.fmt, start, end)
+        output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+-- Initial schema, as previously created by Payments.create_tables() and Logs.create_tables()
+-- users lives in the mino-ai database and is migrated there
+-- Existing databases can skip it with: python migrate.py baseline 0001
+
+CREATE TABLE IF NOT EXISTS payments (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    order_id VARCHAR(255) NOT NULL UNIQUE,
+    amount INT NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    receipt VARCHAR(255),
+    notes TEXT,
+    status VARCHAR(50) NOT NULL,
+    provider VARCHAR(50) NOT NULL,
+    provider_payment_id VARCHAR(255),
+    provider_order_id VARCHAR(255),
+    provider_signature VARCHAR(512),
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    INDEX idx_user_id (user_id),
+    INDEX idx_order_id (order_id),
+    INDEX idx_provider_order_id (provider_order_id),
+    INDEX idx_status (status),
+    INDEX idx_provider (provider),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS payment_logs (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    txnid VARCHAR(255) UNIQUE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    created_at DATETIME NOT NULL
+);
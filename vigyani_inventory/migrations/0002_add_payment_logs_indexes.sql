@@ -0,0 +1,7 @@
+-- Migration script to add the indexes used by the payment logs API
+
+-- Keyset pagination and date-range filters: ORDER BY created_at DESC, id DESC
+CREATE INDEX idx_created_at ON payment_logs(created_at, id);
+
+-- Status filter (and the GROUP BY status summary) combined with a date range
+CREATE INDEX idx_status_created_at ON payment_logs(status, created_at, id);
@@ -0,0 +1,15 @@
+-- Indexes for the payment lookups on the verify/webhook and history paths
+
+-- Payments.get_by_provider_payment_id (verify-payment, webhooks)
+CREATE INDEX idx_provider_payment_id ON payments(provider_payment_id);
+
+-- Payments.get_latest_by_user_id: WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1
+CREATE INDEX idx_user_updated_at ON payments(user_id, updated_at);
+
+-- Payments.get_user_payments / payment history: WHERE user_id = ? ORDER BY created_at DESC
+CREATE INDEX idx_user_created_at ON payments(user_id, created_at);
+
+-- Redundant now: user_id is a prefix of the composites above (which also serve the
+-- foreign key) and order_id already has its UNIQUE index
+DROP INDEX idx_user_id ON payments;
+DROP INDEX idx_order_id ON payments;
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from flask import Flask, g
+import app.models.payment as payment_model
+from app.utils import model_cache
+from app.utils.db import UnitOfWork
+
+
+@pytest.fixture
+def payments(monkeypatch):
+    """One payments row behind a fake connection; yields the executed statements"""
+    row = {column: None for column in payment_model.Payments.COLUMNS}
+    row.update(id=5, user_id=7, amount=Decimal('499.00'), status='created', created_at=datetime(2024, 1, 1))
+    statements = []
+
+    class FakeCursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, query, params=None):
+            statements.append(query)
+
+        def fetchone(self):
+            return dict(row)
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+    @contextmanager
+    def fake_db_connection(*args, **kwargs):
+        yield FakeConnection()
+
+    monkeypatch.setattr(payment_model, 'db_connection', fake_db_connection)
+    monkeypatch.setattr(model_cache, '_caches', {})
+    app = Flask(__name__)
+    app.config.update(MODEL_CACHE_ENABLED=True, CACHE_BACKEND='memory')
+    with app.app_context():
+        yield statements
+
+
+def test_get_by_id_reads_through_the_cache(payments):
+    assert payment_model.Payments.get_by_id(5).amount == Decimal('499.00')
+    assert payment_model.Payments.get_by_id(5).user_id == 7
+    assert len(payments) == 1
+
+
+def test_rows_read_inside_a_unit_of_work_are_not_cached(payments):
+    g._db_unit_of_work = UnitOfWork(conn=None)
+    try:
+        payment_model.Payments.get_by_id(5)
+    finally:
+        g.pop('_db_unit_of_work')
+    assert model_cache.cache_for('Payments').get(5) is None
+    payment_model.Payments.get_by_id(5)
+    assert len(payments) == 2